@@ -0,0 +1,116 @@
+
+import numpy as np
+import json
+import os
+import platform
+import tempfile
+import time
+
+from .dataObjects import *
+from .matrixUtils import *
+from .synthetic import *
+
+from typing import List
+
+
+class StageTimer:
+    """
+    Collects wall times of named stages of one benchmark run.
+    """
+
+    def __init__(self) -> None:
+        self.times = {}
+        self.start = None
+
+    def __call__(self, stage : str):
+        self.current = stage
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.times[self.current] = time.perf_counter() - self.start
+
+
+def benchmarkInstance(personCount : int, seed = 0, historyYears = 20, maxtime = 60, gap = 0.05, visualize = True, workDir : str = None) -> dict:
+    """
+    Generates a synthetic instance of @personCount persons and times each stage of the pipeline:
+    history parsing, CCPM construction, daily matrices, model build, solve (to @gap or @maxtime), extraction and visualization.
+    Returns a dict with instance size, stage times (seconds) and solver results.
+    """
+    from .optimize import optimize
+
+    timer = StageTimer()
+    report = {"personCount" : personCount, "seed" : seed, "historyYears" : historyYears}
+
+    personList, historyNameList, historyMatrix = generateInstance(personCount, seed = seed, historyYears = historyYears)
+    report["historyPersonCount"] = len(historyNameList)
+
+    if workDir is None:
+        workDir = tempfile.mkdtemp(prefix = "druzinkator_bench_")
+    workbook = os.path.join(workDir, f"history_{personCount}_{seed}.xlsx")
+    writeHistoryWorkbook(workbook, historyNameList, historyMatrix)
+
+    with timer("historyParsing"):
+        parsedNames, parsedHistory, _ = vojtaToHistoryMatrix(os.path.abspath(workbook), cacheDir = None)
+
+    with timer("nameMatching"):
+        vojtaNameDict = vojtaNameListToDict(personList, parsedNames)
+
+    with timer("CCPM"):
+        CCPM = historyToCoCoPenaltyMatrix(parsedHistory, vojtaNameDict, personList, np.array([0.5, 0.2, 0.1]))
+
+    problem = generateProblem(personList, CCPM, seed = seed)
+    report["penalizedPairs"] = len(problem.getPairIndex())
+
+    with timer("dailyMatrices"):
+        problem.getDerivedData()
+
+    def hook(model, MM):
+        model.hideOutput()
+        model.setParam('limits/gap', gap)
+
+    solved = optimize(problem, maxtime = maxtime, modelHook = hook, returnStats = True)
+    assignment, stats = solved.assignment, solved.stats
+
+    timer.times["modelBuild"] = stats.buildTime()
+    timer.times["solve"] = stats.phaseTime("solve")
+    timer.times["extraction"] = stats.phaseTime("extraction")
+    report["model"] = {"variables" : stats.variables, "constraints" : stats.constraints, "nonzeros" : stats.nonzeros}
+    report["solver"] = {"status" : stats.status, "gap" : stats.gap, "primalBound" : stats.primalBound,
+                        "dualBound" : stats.dualBound, "nodes" : stats.nodes}
+    report["phases"] = stats.toDict()["phases"]
+
+    if visualize and assignment is not None:
+        from .visualize import plotCCPM, plotCompanyMembersDays
+        with timer("visualization"):
+            for i in range(assignment.companyCount):
+                plotCCPM(assignment, problem, assignment.companies[i], outFile = os.path.join(workDir, f"ccpm_{personCount}_{seed}_{i}.png"))
+                plotCompanyMembersDays(assignment.companies[i], outFile = os.path.join(workDir, f"presence_{personCount}_{seed}_{i}.png"))
+
+    report["stages"] = timer.times
+    return report
+
+
+def runBenchmark(personCounts : List[int] = [50, 100, 200, 400, 1000], seeds : List[int] = [0], outFile : str = None, **kwargs) -> dict:
+    """
+    Sweeps person counts (and seeds) with benchmarkInstance() and returns a machine readable report.
+    If @outFile is given, the report is written there as JSON after each instance, so partial results survive.
+    """
+    import pyscipopt
+    report = {"timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S"), "python" : platform.python_version(), "numpy" : np.__version__,
+              "pyscipopt" : getattr(pyscipopt, "__version__", None), "machine" : platform.platform(), "runs" : []}
+
+    for personCount in personCounts:
+        for seed in seeds:
+            print(f"Benchmarking {personCount} persons, seed {seed}")
+            run = benchmarkInstance(personCount, seed = seed, **kwargs)
+            print("  " + ", ".join(f"{stage} {t:.3f}s" for stage, t in run["stages"].items()))
+            report["runs"].append(run)
+            if outFile is not None:
+                with open(outFile, 'w') as file:
+                    json.dump(report, file, indent = 2)
+
+    return report
@@ -1,12 +1,170 @@
 import numpy as np
+import scipy.sparse as sp
+import weakref
 from typing import List
 
+DEFAULT_COMPANY_COUNT = 4
+DEFAULT_DAY_COUNT = 14
+
+class PersonTable:
+    """
+    Columnar store of data of persons.  Person objects are lightweight views (table, row) into it, so that filtering
+    and aggregation over many persons are array operations.  Rows are only ever appended, a person moved to another
+    table leaves a dead row behind.
+
+    Attributes:
+    ---------
+    presence : np.array, rows by days.  Presence vectors of persons.
+    attributes : np.array, rows by attributes.  Attribute values, 0 where a person does not have the attribute.
+    attributeIndex : dict mapping attribute name to column of attributes.  Column 0 is always "human".
+    names : list of names of persons, by row
+    nameIndex : dict mapping name to row (the last row of that name)
+    """
+
+    def __init__(self, dayCount : int = DEFAULT_DAY_COUNT, capacity = 16) -> None:
+        self.presence = np.zeros((capacity, dayCount))
+        self.attributes = np.zeros((capacity, 1))
+        self.attributeIndex = {"human" : 0}
+        self.names = []
+        self.nameIndex = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def dayCount(self) -> int:
+        return self.presence.shape[1]
+
+    def addRow(self, name : str, presence : np.array, attributes : dict) -> int:
+        """
+        Appends a person, returns its row.
+        """
+        row = len(self.names)
+        if row == self.presence.shape[0]:
+            capacity = 2 * row + 1
+            self.presence = np.resize(self.presence, (capacity, self.dayCount))
+            self.attributes = np.resize(self.attributes, (capacity, self.attributes.shape[1]))
+        self.presence[row] = presence
+        self.attributes[row] = 0
+        for attribute, value in attributes.items():
+            column = self.column(attribute, create = True)
+            self.attributes[row, column] = value
+        self.names.append(name)
+        self.nameIndex[name] = row
+        return row
+
+    def column(self, attribute : str, create = False) -> int:
+        """
+        Returns column of @attribute, or None if no person has it.  With @create, a missing column is added.
+        """
+        column = self.attributeIndex.get(attribute, None)
+        if column is None and create:
+            column = self.attributes.shape[1]
+            self.attributes = np.hstack([self.attributes, np.zeros((self.attributes.shape[0], 1))])
+            self.attributeIndex[attribute] = column
+        return column
+
+    def attributeValues(self, attribute : str, rows : np.array = None) -> np.array:
+        """
+        Returns values of @attribute at @rows (defaults to all rows).
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        column = self.attributeIndex.get(attribute, None)
+        if column is None:
+            return np.zeros(len(rows))
+        return self.attributes[rows, column]
+
+    def rowAttributes(self, row : int) -> dict:
+        """
+        Returns nonzero attributes of the person at @row as a dict.
+        """
+        return {attribute : float(self.attributes[row, column]) for attribute, column in self.attributeIndex.items()
+                if self.attributes[row, column] != 0}
+
+    @staticmethod
+    def fromArrays(names : List[str], presence : np.array, attributeNames : List[str], attributeValues : np.array, birthYears : List[int] = None) -> list:
+        """
+        Creates a table holding persons of given @names, @presence (persons by days) and @attributeValues (persons by
+        @attributeNames) at once.  Returns the list of Person views into it.  Much faster than creating persons one by one.
+        """
+        personCount = len(names)
+        table = PersonTable(presence.shape[1], capacity = personCount)
+        table.presence[:] = presence
+        for attribute in attributeNames:
+            table.column(attribute, create = True)
+        table.attributes[:, [table.attributeIndex[a] for a in attributeNames]] = attributeValues
+        table.attributes[:, 0] = 1.0
+        table.names = list(names)
+        table.nameIndex = {name : row for row, name in enumerate(table.names)}
+
+        personList = []
+        for row, name in enumerate(table.names):
+            person = Person.__new__(Person)
+            person.name = name
+            person.birthYear = birthYears[row] if birthYears is not None else None
+            person.owners = weakref.WeakSet()
+            person.table = table
+            person.row = row
+            personList.append(person)
+        return personList
+
+    @staticmethod
+    def gather(personList : list):
+        """
+        Makes sure all persons of @personList live in a single table, moving persons there if needed (into the table 
+        holding most of them).  Returns (table, rows), rows being the row of each person in the table.
+        Moving drops caches of problems holding the persons, so only Problem uses this, read only code uses rowsOf().
+        """
+        if not personList:
+            return PersonTable(), np.zeros(0, dtype=int)
+
+        counts = {}
+        for person in personList:
+            counts[id(person.table)] = counts.get(id(person.table), 0) + 1
+        table = max((person.table for person in personList), key = lambda t : counts[id(t)])
+
+        if counts[id(table)] != len(personList):
+            for person in personList:
+                if person.table is not table:
+                    if person.table.dayCount != table.dayCount:
+                        raise Exception(f"Wrong length of presence vector of {person.name}. Wanted {table.dayCount}, got {person.table.dayCount}")
+                    person.moveTo(table)
+
+        return table, np.fromiter((person.row for person in personList), dtype=int, count = len(personList))
+
+    @staticmethod
+    def rowsOf(personList : list):
+        """
+        Read only counterpart of gather(): returns (table, rows) of @personList without moving anybody.  If the persons
+        live in different tables, their rows are copied into a new temporary table.
+        """
+        if not personList:
+            return PersonTable(), np.zeros(0, dtype=int)
+
+        table = personList[0].table
+        if all(person.table is table for person in personList):
+            return table, np.fromiter((person.row for person in personList), dtype=int, count = len(personList))
+
+        copy = PersonTable(table.dayCount, capacity = len(personList))
+        for person in personList:
+            if person.table.dayCount != copy.dayCount:
+                raise Exception(f"Wrong length of presence vector of {person.name}. Wanted {copy.dayCount}, got {person.table.dayCount}")
+            copy.addRow(person.name, person.table.presence[person.row], person.table.rowAttributes(person.row))
+        return copy, np.arange(len(personList))
+
+
 class Person:
     """
     Ocejak vulgaris taboritae. 
+
+    A view into a PersonTable holding the actual data.  A new person gets a table of its own, Problem gathers its 
+    persons into a shared one.
     """
 
-    def __init__(self, name, *atributes, presence = None, birthYear : int = None, addTo : List = None):
+    __slots__ = ("name", "birthYear", "table", "row", "owners", "__weakref__")
+
+    def __init__(self, name, *atributes, presence = None, birthYear : int = None, addTo : List = None, dayCount : int = DEFAULT_DAY_COUNT):
         """
         Params:
         ---------
@@ -15,45 +173,97 @@ class Person:
         *atributes: either string or (string, value)
             optional. Initialises supplied attribute names to 1.
             Alternatively, if an attribute is supplied in the form of a tuple, it is initialized to the value of the second element.
-        presence : numpy array of 1s and 0s, length = 14
+        presence : numpy array of 1s and 0s, one element per day of camp
             optional (defaults to ones). 1 -> person is present on that day, 0-> not present
         addTo : list of Person.  Optional.  If specified, constructor appends newly created object to this list.
         birthYear : year the person was born, defaults to unknown (None)
+        dayCount : length of default presence vector, if presence is not supplied.  (All persons of a Problem must have the same length)
         Example:
             j = Person("Jan Tleskač", "jokerit", ("matfyz", 0.2))
             
         """
         self.name = name
         self.birthYear = birthYear
+        self.owners = weakref.WeakSet()     #problems caching data derived from this person, see Problem.getDerivedData()
         if presence is None:
-            presence = np.ones(14)
-        elif len(presence) != 14:
-            raise Exception(f"Wrong length of supplied presence vector. Wanted 14, got {len(presence)}")
-        if isinstance(presence, List):
-            presence = np.array(presence)
-        self.presence = presence.flatten()
-        self.presence = self.presence.astype(float)
-        self.dict = {}
-
-        self.dict["human"] = 1.0
+            presence = np.ones(dayCount)
+        presence = np.array(presence, dtype=float).flatten()
 
+        attributeDict = {"human" : 1.0}
         for a in atributes:
             if(a == "human"):
                 raise Exception(f"Setting attribute 'human' is forbidden.  (It is automatically initialised to 1)")
             if isinstance(a, tuple):
-                self.dict[a[0]] = a[1]
+                attributeDict[a[0]] = a[1]
             else:
-                self.dict[a] = 1.0
+                attributeDict[a] = 1.0
+
+        self.table = PersonTable(len(presence), capacity = 1)
+        self.row = self.table.addRow(name, presence, attributeDict)
 
         if addTo is not None:
             addTo.append(self)
 
+    @property
+    def presence(self) -> np.array:
+        """
+        Presence vector, one element per day of camp.  Read only: assign a new vector to change it, so that problems
+        holding this person notice the change.
+        """
+        presence = self.table.presence[self.row]
+        presence.flags.writeable = False
+        return presence
+
+    @presence.setter
+    def presence(self, presence):
+        presence = np.array(presence, dtype=float).flatten()
+        if len(presence) != self.table.dayCount:
+            raise Exception(f"Wrong length of presence vector of {self.name}. Wanted {self.table.dayCount}, got {len(presence)}")
+        self.table.presence[self.row] = presence
+        self.notifyOwners()
+
+    @property
+    def dict(self) -> dict:
+        """
+        Nonzero attributes of this person as a dict (a copy, use set() to change them).
+        """
+        return self.table.rowAttributes(self.row)
+
+    def moveTo(self, table : PersonTable):
+        """
+        Copies data of this person to @table and makes this person a view into it.
+        """
+        self.row = table.addRow(self.name, self.table.presence[self.row], self.dict)
+        self.table = table
+        self.notifyOwners()
+
+    def notifyOwners(self):
+        """
+        Drops cached data derived from this person in all problems holding it.
+        """
+        for problem in list(self.owners):
+            problem.invalidateDerivedData()
+
+    def __getstate__(self):
+        return {"name" : self.name, "birthYear" : self.birthYear, "presence" : self.table.presence[self.row].copy(), "dict" : self.dict}
+
+    def __setstate__(self, state):
+        #also reads persons pickled before PersonTable, whose presence vector may be stored as presenceVector
+        presence = np.array(state.get("presence", state.get("presenceVector")), dtype=float).flatten()
+        self.name = state["name"]
+        self.birthYear = state.get("birthYear", None)
+        self.owners = weakref.WeakSet()
+        self.table = PersonTable(len(presence), capacity = 1)
+        self.row = self.table.addRow(self.name, presence, state["dict"])
 
     def get(self, attribute):
         """
         Gets value of specified attribute (or 0 if that attribute is not present)
         """
-        return self.dict.get(attribute, 0.0)
+        column = self.table.attributeIndex.get(attribute, None)
+        if column is None:
+            return 0.0
+        return self.table.attributes[self.row, column]
 
     def set(self, attribute, value=1.0):
         """
@@ -61,7 +271,9 @@ class Person:
         """
         if(attribute == "human"):
             raise Exception(f"Setting attribute 'human' is forbidden.  (Is automatically initialised to 1)")
-        self.dict[attribute] = value
+        column = self.table.column(attribute, create = True)
+        self.table.attributes[self.row, column] = value
+        self.notifyOwners()
     
     def __str__(self) -> str:
         s = ""
@@ -80,51 +292,236 @@ class Assignment:
 
     companies : List[List[Person]]
     personList : List[Person]
-    SCM : np.matrix
+    companyVector : np.array
 
-    def __init__(self, personList : List[Person], membershipMatrix : np.matrix, sharedCompanyMatrix: np.matrix) -> None:
+    def __init__(self, personList : List[Person], membershipMatrix : np.matrix, sharedCompanyMatrix: np.matrix = None) -> None:
         """
         Params:
         ---------
         personList : list of all persons
-        membershipMatrix : 4 by len(personList) numpy matrix.  Each column must have exactly one element equal to 1 and rest zeroes.
+        membershipMatrix : number of companies by len(personList) numpy matrix.  Each column must have exactly one element equal to 1 and rest zeroes.
                 Describes assignment of persons into companies.
-        sharedCompanyMatrix : len(personList) by len(personList) matrix.  Element at i,j is 1 if ith and jth person share company, 0 otherwise. Optional
+        sharedCompanyMatrix : ignored, kept for compatibility.  The shared company matrix is derived from membership, see SCM.
+
+        Only the company vector (company of each person) is kept, see fromCompanyVector().
+        """
+        membershipMatrix = np.asarray(membershipMatrix)
+        companies = np.where(membershipMatrix.any(axis = 0), membershipMatrix.argmax(axis = 0), -1)
+        self.setCompanies(personList, companies, membershipMatrix.shape[0])
+
+    @staticmethod
+    def fromCompanyVector(personList : List[Person], companies : np.array, companyCount : int = DEFAULT_COMPANY_COUNT):
+        """
+        Builds an Assignment out of a vector holding company index of each person (-1 for persons left out).
         """
+        assignment = Assignment.__new__(Assignment)
+        assignment.setCompanies(personList, companies, companyCount)
+        return assignment
+
+    def setCompanies(self, personList : List[Person], companies : np.array, companyCount : int):
         self.personList = personList
-        self.membershipMatrix = membershipMatrix
-        self.SCM = sharedCompanyMatrix
+        self.companyVector = np.asarray(companies, dtype=int)
+        self.companyCount = companyCount
 
         #prepare lists of companies and dictionary for membership lookup
+        self.dict = {person.name : int(c) for person, c in zip(personList, self.companyVector) if c >= 0}
+        self.companies = [[personList[j] for j in np.flatnonzero(self.companyVector == i)] for i in range(companyCount)]
 
-        self.dict = {}
+    @property
+    def membershipMatrix(self) -> np.array:
+        """
+        Number of companies by len(personList) matrix, element at i,j is 1 if jth person is in ith company.
+        """
+        MM = np.zeros((self.companyCount, len(self.personList)), dtype=int)
+        assigned = np.flatnonzero(self.companyVector >= 0)
+        MM[self.companyVector[assigned], assigned] = 1
+        return MM
 
-        self.companies = []
-        for i in range(4):
-            companyList = []
-            self.companies.append(companyList)
-            for j, person in enumerate(personList):
-                if(membershipMatrix[i,j]):
-                    companyList.append(person)
-                    self.dict[person.name] = i
-                    #print(f"MM@[{i},{j}] = {membershipMatrix[i,j]}, {person.name} -> C{i}")
+    @property
+    def SCM(self) -> np.array:
+        """
+        Shared company matrix, len(personList) by len(personList).  Element at i,j is 1 if ith and jth person share company.
+        Computed on demand, prefer comparing companyVector entries where possible.
+        """
+        companies = self.companyVector
+        return ((companies[:, np.newaxis] == companies[np.newaxis, :]) & (companies[:, np.newaxis] >= 0)).astype(int)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["companies"], state["dict"]
+        return state
+
+    def __setstate__(self, state):
+        if "membershipMatrix" in state:
+            #assignments pickled with dense membership and shared company matrices
+            membershipMatrix = np.asarray(state["membershipMatrix"])
+            companies = np.where(membershipMatrix.any(axis = 0), membershipMatrix.argmax(axis = 0), -1)
+            self.setCompanies(state["personList"], companies, membershipMatrix.shape[0])
+        else:
+            self.setCompanies(state["personList"], state["companyVector"], state["companyCount"])
 
     def getCompanyByName(self, personName : str) -> int:
         """
-        Returns company id of specified person (0,1,2,3) or None if that person is not included in solution
+        Returns company id of specified person (0 to companyCount-1) or None if that person is not included in solution
         """
         return self.dict.get(personName, None)
 
     def __str__(self) -> str:
         s = ""
         s += f"===Assignment for total of {len(self.personList)} persons===\n\r"
-        for i in range(4):
+        for i in range(self.companyCount):
             s += f"Company {i} : {[person.name for person in self.companies[i]]}\n\r"
 
         return s
 
 
 
+class DerivedData:
+    """
+    Arrays derived from persons and attributes, computed vectorized at once.  Problem keeps one instance cached, 
+    see Problem.getDerivedData().  The arrays are read only, since they are shared by everybody using the cache.
+
+    Attributes:
+    ---------
+    DAT : np.array, persons by attributes by days.  Daily attribute tensor.  Value of each attribute of each person 
+        on days that person is present, 0 on other days.
+    DSM : np.array, attributes by days.  Daily sum matrix, sums of attributes present on each day.
+    DIM : np.array, attributes by days.  Daily ideal matrix, ideal amount of attributes per company on each day.
+    """
+
+    def __init__(self, personList : List[Person], attributeList : List[str], companyCount : int = DEFAULT_COMPANY_COUNT, dayCount : int = None) -> None:
+        table, rows = PersonTable.rowsOf(personList)
+        if dayCount is None:
+            dayCount = table.dayCount
+        presence = table.presence[rows].reshape(len(rows), dayCount)
+        values = np.zeros((len(rows), len(attributeList)))
+        for i, attribute in enumerate(attributeList):
+            values[:, i] = table.attributeValues(attribute, rows)
+
+        self.attributeList = list(attributeList)
+        self.DAT = values[:, :, np.newaxis] * presence[:, np.newaxis, :]
+        self.DSM = self.DAT.sum(axis = 0)
+        self.DIM = self.DSM / companyCount
+        for array in [self.DAT, self.DSM, self.DIM]:
+            array.flags.writeable = False
+
+    def DAM_list(self) -> List[np.array]:
+        """
+        Returns daily attribute matrices (persons by days) as views into DAT, one per attribute.  See calculateDailyMatrices().
+        """
+        return [self.DAT[:, i, :] for i in range(len(self.attributeList))]
+
+
+class PairIndex:
+    """
+    Sparse index of pairs of persons that interact in the optimization problem, stored CSR-style over the upper triangle.
+    Built once from nonzeros of CCPM, the presence overlap matrix and personalCouplingList.  Pairs that carry a co-company
+    penalty but are never present on the same day are dropped, since sharing a company costs them nothing.
+
+    Attributes:
+    ---------
+    indptr : np.array, len(personList)+1.  Pairs of ith person are at positions indptr[i] to indptr[i+1]-1.
+    indices : np.array.  Index of the second person of each pair (always greater than the first one).
+    ccp : np.array.  Value of CCPM for each pair.
+    overlap : np.array.  Number of days both persons of each pair are present.
+    penalty : np.array.  ccp * overlap, i.e. the cost of the pair sharing a company.
+    selfPenalty : float.  Sum of penalties on the CCPM diagonal (constant, everyone shares a company with themselves).
+    couplings : list of tuples (i, j, desiredProduct, softWeight), softWeight is None for hard couplings.
+    """
+
+    def __init__(self, problem) -> None:
+        personList = problem.personList
+        personCount = len(personList)
+
+        table, tableRows = problem.getPersonTable()
+        P = sp.csr_matrix(table.presence[tableRows])
+        overlapMatrix = (P @ P.T).tocsr()
+
+        rows = np.zeros(0, dtype=int)
+        cols = np.zeros(0, dtype=int)
+        ccp = np.zeros(0)
+        self.selfPenalty = 0.0
+        if problem.CCPM is not None:
+            CCPM = sp.csr_matrix(problem.CCPM)
+            diagonal = CCPM.diagonal()
+            self.selfPenalty = float(np.sum(diagonal * overlapMatrix.diagonal()))
+            upper = sp.triu(CCPM, k = 1).tocoo()
+            rows, cols, ccp = upper.row, upper.col, upper.data
+
+        overlap = np.asarray(overlapMatrix[rows, cols]).ravel() if len(rows) else np.zeros(0)
+        keep = (overlap != 0) & (ccp != 0)
+        rows, cols, ccp, overlap = rows[keep], cols[keep], ccp[keep], overlap[keep]
+
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        self.indptr = np.searchsorted(rows, np.arange(personCount + 1))
+        self.indices = cols
+        self.ccp = ccp[order]
+        self.overlap = overlap[order]
+        self.penalty = self.ccp * self.overlap
+        self.personCount = personCount
+
+        self.couplings = []
+        for coupling in problem.personalCouplingList:
+            i = problem.personDict[coupling[0].name]
+            j = problem.personDict[coupling[1].name]
+            softWeight = coupling[3] if len(coupling) > 3 else None
+            self.couplings.append( (min(i,j), max(i,j), coupling[2], softWeight) )
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def rows(self) -> np.array:
+        """
+        Returns index of the first person of each pair (the expanded counterpart of indptr).
+        """
+        return np.repeat(np.arange(self.personCount), np.diff(self.indptr))
+
+    def contract(self, unitOf : np.array, unitCount : int):
+        """
+        Returns PairIndex over units instead of persons, @unitOf holding unit index of each person.  Penalties of pairs
+        mapped onto the same pair of units are summed (ccp and overlap too, those are then only informative).
+        Persons of one unit always share a company: penalties of pairs within a unit are added to selfPenalty, couplings
+        within a unit are dropped if they keep together and add their penalty to selfPenalty if they softly keep apart.
+        Hard keep apart within a unit cannot be satisfied and raises an Exception.
+        """
+        unitOf = np.asarray(unitOf, dtype=int)
+        rows, cols = unitOf[self.rows()], unitOf[self.indices]
+        within = rows == cols
+
+        contracted = PairIndex.__new__(PairIndex)
+        contracted.selfPenalty = self.selfPenalty + float(np.sum(self.penalty[within]))
+        contracted.personCount = unitCount
+
+        first, second = np.minimum(rows, cols)[~within], np.maximum(rows, cols)[~within]
+        summed = [sp.csr_matrix((values[~within], (first, second)), shape = (unitCount, unitCount)) for values in [self.ccp, self.overlap, self.penalty]]
+        for matrix in summed:
+            matrix.sum_duplicates()
+            matrix.sort_indices()
+        contracted.indptr = summed[0].indptr
+        contracted.indices = summed[0].indices
+        contracted.ccp, contracted.overlap, contracted.penalty = [matrix.data for matrix in summed]
+
+        contracted.couplings = []
+        for i, j, desiredProduct, softWeight in self.couplings:
+            if unitOf[i] != unitOf[j]:
+                contracted.couplings.append( (min(unitOf[i], unitOf[j]), max(unitOf[i], unitOf[j]), desiredProduct, softWeight) )
+            elif desiredProduct == 0:
+                if softWeight is None:
+                    raise Exception(f"Persons {i} and {j} must be kept apart, but share a unit.")
+                contracted.selfPenalty += softWeight
+        return contracted
+
+    def toSparse(self, values : np.array = None) -> sp.csr_matrix:
+        """
+        Returns a symmetric sparse personCount by personCount matrix holding @values (defaults to ccp) for each pair.
+        """
+        if values is None:
+            values = self.ccp
+        upper = sp.csr_matrix((values, self.indices, self.indptr), shape = (self.personCount, self.personCount))
+        return (upper + upper.T).tocsr()
+
+
 class Problem:
     """
     Object for high-level description of the optim. problem, weighs etc.
@@ -145,7 +542,23 @@ class Problem:
     personalCouplingList : List[tuple] 
     
 
-    def __init__(self, personList) -> None:
+    def __init__(self, personList, companyCount : int = DEFAULT_COMPANY_COUNT, dayCount : int = None) -> None:
+        """
+        Params:
+        ---------
+        personList : list of all persons in camp
+        companyCount : number of companies to split persons into
+        dayCount : number of days of camp.  Inferred from presence vectors of persons if not given.
+            All presence vectors must have this length.
+        """
+        if dayCount is None:
+            dayCount = len(personList[0].presence) if personList else DEFAULT_DAY_COUNT
+        for person in personList:
+            if len(person.presence) != dayCount:
+                raise Exception(f"Wrong length of presence vector of {person.name}. Wanted {dayCount}, got {len(person.presence)}")
+
+        self.companyCount = companyCount
+        self.dayCount = dayCount
         self.personList = personList
         self.companyFixList = [None] * len(personList)
         self.personDict = {}
@@ -156,8 +569,31 @@ class Problem:
         self.attributeLimitsList = []
         self.personalCouplingList = []
 
+        self.personTable = None
+        self.derivedData = None
+        self.pairIndex = None
+
         for i, person in enumerate(personList):
             self.personDict[person.name] = i
+            person.owners.add(self)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["personTable"] = None
+        state["derivedData"] = None
+        state["pairIndex"] = None
+        return state
+
+    def __setstate__(self, state):
+        #problems pickled before company and day counts were configurable
+        state.setdefault("companyCount", DEFAULT_COMPANY_COUNT)
+        state.setdefault("dayCount", DEFAULT_DAY_COUNT)
+        state["personTable"] = None
+        state["derivedData"] = None
+        state["pairIndex"] = None
+        self.__dict__.update(state)
+        for person in self.personList:
+            person.owners.add(self)
 
     def __registerAttribute(self, attr : str):
         gotten = self.attributeDict.get(attr, None)
@@ -165,6 +601,7 @@ class Problem:
             self.attributeDict[attr] = len(self.attributeList)
             self.attributeList.append(attr)
             self.AAEweighs.append(None)
+            self.derivedData = None
         #print(f"regAtt: {attr}, gotten = {gotten}.  {self.attributeList}")
 
     def getPersonByName(self, name : str):
@@ -177,8 +614,8 @@ class Problem:
         """
         Adds a hard constraint that @person be placed in company number @company, if @person is part of this problem.
         """
-        if company not in [0,1,2,3]:
-            raise Exception(f"Cannot fix {person.name}'s company to {company}.  Only company values {{0,1,2,3}} are allowed.")
+        if company not in range(self.companyCount):
+            raise Exception(f"Cannot fix {person.name}'s company to {company}.  Only company values 0 to {self.companyCount - 1} are allowed.")
         index = self.personDict.get(person.name, None)
         if index is not None:
             self.companyFixList[index] = company
@@ -193,12 +630,76 @@ class Problem:
             if index is not None:
                 self.companyFixList[index] = oldAss.getCompanyByName(p.name)
 
+    def subProblem(self, personList : List[Person]):
+        """
+        Returns a new Problem restricted to @personList (which must be a subset of this problem's persons).
+        Attributes, weighs and limits are shared, CCPM, fixings and couplings are restricted to the given persons.
+        """
+        sub = Problem(personList, self.companyCount, self.dayCount)
+        sub.attributeList = list(self.attributeList)
+        sub.attributeDict = dict(self.attributeDict)
+        sub.AAEweighs = list(self.AAEweighs)
+        sub.attributeLimitsList = list(self.attributeLimitsList)
+
+        indices = [self.personDict[p.name] for p in personList]
+        if self.CCPM is not None:
+            sub.CCPM = self.CCPM[indices, :][:, indices]
+        sub.companyFixList = [self.companyFixList[i] for i in indices]
+        sub.personalCouplingList = [c for c in self.personalCouplingList
+                                    if c[0].name in sub.personDict and c[1].name in sub.personDict]
+        return sub
+
     def setCCPM(self, CCPM : np.matrix):
         """
-        Sets the Co-company penalty matrix to be used.
+        Sets the Co-company penalty matrix to be used.  Either a dense numpy matrix or a scipy sparse matrix.
         Obtained by calling vojtaToHistoryMatrix() and historyToCoCompanyPenalty()
         """
         self.CCPM = CCPM
+        self.pairIndex = None
+
+    def invalidateDerivedData(self):
+        """
+        Drops cached DerivedData and PairIndex.  Called by persons of this problem when their attributes or presence
+        change, or when they move to another PersonTable.
+        """
+        self.personTable = None
+        self.derivedData = None
+        self.pairIndex = None
+
+    def getPersonTable(self):
+        """
+        Returns (table, rows): the PersonTable holding all persons of this problem and the row of each person in it.
+        Persons are gathered into a single table on first use.
+        """
+        if self.personTable is None:
+            self.personTable = PersonTable.gather(self.personList)
+        return self.personTable
+
+    def getDerivedData(self) -> DerivedData:
+        """
+        Returns DerivedData (daily attribute tensor, daily sums and ideals) of persons and attributes of this problem.
+        Computed once and cached until a person's attributes or presence, or the list of attributes, change.
+        """
+        if self.derivedData is None:
+            self.getPersonTable()
+            self.derivedData = DerivedData(self.personList, self.attributeList, self.companyCount, self.dayCount)
+        return self.derivedData
+
+    def getDailyMatrices(self):
+        """
+        Cached equivalent of calculateDailyMatrices(problem.personList, problem.attributeList).  Returns (DSM, DAM_list).
+        """
+        derivedData = self.getDerivedData()
+        return derivedData.DSM, derivedData.DAM_list()
+
+    def getPairIndex(self) -> PairIndex:
+        """
+        Returns sparse index of interacting pairs of persons from current CCPM, presence of persons and couplings.
+        Cached until one of those changes.
+        """
+        if self.pairIndex is None:
+            self.pairIndex = PairIndex(self)
+        return self.pairIndex
 
     def setAttributeErrorWeigh(self, attribute : str, dailyWeighVector : np.array):
         """
@@ -212,17 +713,19 @@ class Problem:
         self.__registerAttribute(attribute)
         self.AAEweighs[self.attributeDict[attribute]] = dailyWeighVector.flatten()
 
-    def addAttributeLimits(self, attribute : str, min = -np.inf, max = np.inf, soft = False, softPenalty = 100, enableVector = np.ones((1,14))):
+    def addAttributeLimits(self, attribute : str, min = -np.inf, max = np.inf, soft = False, softPenalty = 100, enableVector = None):
         """
         Adds (inclusive) limits for sum of defined attribute to problem constraints.
         If soft is True, this translates into a soft constraint with penalty equal to softPenalty.
-        The constraint only applies on days whose value is 1 in enableVector.
+        The constraint only applies on days whose value is 1 in enableVector (defaults to all days).
         
         Example use:
         problem.setAttributeLimits("rarasek", min=1)
             Require that the sum of present attribute "rarasek" is always at least 1 in each company on each day.
         """
         self.__registerAttribute(attribute)
+        if enableVector is None:
+            enableVector = np.ones(self.dayCount)
         if soft:
             limitTuple = (self.attributeDict[attribute], min, max, enableVector.flatten(), softPenalty)
             self.attributeLimitsList.append(limitTuple)
@@ -240,6 +743,7 @@ class Problem:
             self.personalCouplingList.append( (person1, person2, product, softPenalty) )
         else:
             self.personalCouplingList.append( (person1, person2, product) )
+        self.pairIndex = None
 
     def keepApart(self, person1 : Person, person2 : Person, soft = False, softPenalty = 100):
         """
@@ -250,6 +754,7 @@ class Problem:
             self.personalCouplingList.append( (person1, person2, product, softPenalty) )
         else:
             self.personalCouplingList.append( (person1, person2, product) )
+        self.pairIndex = None
 
     def report(self):
         s = "Problem definition report:\n"
@@ -269,7 +774,7 @@ class Problem:
         s += "------Free People-------\n"
         freeList = []
         fixedListOfLists = []
-        for i in range(4):
+        for i in range(self.companyCount):
             fixedListOfLists.append([])
         for i, person in enumerate(self.personList):
             if self.companyFixList[i] is None:
@@ -286,7 +791,7 @@ class Problem:
             s+=p
         s += "]\n"
         s += "------Fixed People-------\n"
-        for i in range(4):
+        for i in range(self.companyCount):
             s+= f"C{i}: {fixedListOfLists[i]}\n"
 
         kAList = []
@@ -302,6 +807,10 @@ class Problem:
             else:
                 kAList.append(cs)
 
+        pairIndex = self.getPairIndex()
+        s += f"------Interacting pairs-----\n"
+        s += f"{len(pairIndex)} penalized pairs (total penalty if all shared a company: {np.sum(pairIndex.penalty):.1f}), {len(pairIndex.couplings)} couplings\n"
+
         s += f"------Keep apart-----\n"
         for cs in kAList:
             s += f"{cs}\n"
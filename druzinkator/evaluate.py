@@ -0,0 +1,133 @@
+
+import numpy as np
+
+from .dataObjects import *
+from .matrixUtils import *
+
+from typing import List
+
+
+class Evaluation:
+    """
+    Cost of an assignment broken down into the terms of the objective of optimize(), plus violations of hard constraints.
+
+    total : float.  Total cost, equal to the objective value SCIP would report for the same assignment.
+    attributeErrors : dict mapping attribute to its weighed absolute attribute error
+    coCompanyPenalty : float.  Sum of co-company penalties times days of presence overlap
+    softLimits : list of (attribute, min, max, cost) for each soft attribute limit
+    softCouplings : list of (name1, name2, "together"/"apart", cost) for each soft coupling
+    violations : list of strings describing violated hard constraints.  Empty if the assignment is feasible.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0.0
+        self.attributeErrors = {}
+        self.coCompanyPenalty = 0.0
+        self.softLimits = []
+        self.softCouplings = []
+        self.violations = []
+
+    def isFeasible(self) -> bool:
+        return len(self.violations) == 0
+
+    def __str__(self) -> str:
+        s = f"===Evaluation: total cost {self.total:.2f}===\n"
+        for attr, cost in self.attributeErrors.items():
+            s += f"AAE {attr}: {cost:.2f}\n"
+        s += f"Co-company penalty: {self.coCompanyPenalty:.2f}\n"
+        for attr, min, max, cost in self.softLimits:
+            s += f"Soft limit {attr} in [{min}, {max}]: {cost:.2f}\n"
+        for name1, name2, kind, cost in self.softCouplings:
+            s += f"Soft keep {kind} {name1} - {name2}: {cost:.2f}\n"
+        if self.violations:
+            s += f"Hard constraint violations ({len(self.violations)}):\n"
+            for v in self.violations:
+                s += f"  {v}\n"
+        else:
+            s += "All hard constraints satisfied\n"
+        return s
+
+
+def assignmentToCompanyVector(problem : Problem, assignment : Assignment) -> np.array:
+    """
+    Returns company index of each person of @problem in @assignment, -1 for persons missing from assignment.
+    """
+    if assignment.personList is problem.personList:
+        return assignment.companyVector.copy()
+    companies = [assignment.getCompanyByName(p.name) for p in problem.personList]
+    return np.array([-1 if c is None else c for c in companies], dtype=int)
+
+
+def evaluateAssignment(problem : Problem, assignment, tolerance = 1e-6) -> Evaluation:
+    """
+    Evaluates @assignment (an Assignment or a vector of company indices of problem.personList) without invoking the solver.
+    Returns Evaluation with total cost, its breakdown and list of violated hard constraints.
+    """
+    if isinstance(assignment, Assignment):
+        companies = assignmentToCompanyVector(problem, assignment)
+    else:
+        companies = np.asarray(assignment, dtype=int)
+
+    personList = problem.personList
+    personCount = len(personList)
+    evaluation = Evaluation()
+
+    missing = np.flatnonzero(companies < 0)
+    for j in missing:
+        evaluation.violations.append(f"{personList[j].name} is not assigned to any company")
+
+    #attribute sums per company: companies by attributes by days
+    derivedData = problem.getDerivedData()
+    DIM = derivedData.DIM
+    onehot = np.zeros((personCount, problem.companyCount))
+    assigned = np.flatnonzero(companies >= 0)
+    onehot[assigned, companies[assigned]] = 1
+    ASM = np.einsum('pc,pad->cad', onehot, derivedData.DAT)
+
+    #  ABSOLUTE ATTRIBUTE ERRORS
+    for i, w in enumerate(problem.AAEweighs):
+        if w is None:
+            continue
+        cost = float(np.sum(np.abs(ASM[:, i, :] - DIM[i, :]) @ w))
+        evaluation.attributeErrors[problem.attributeList[i]] = cost
+        evaluation.total += cost
+
+    #  CO-COMPANY PENALTIES
+    pairIndex = problem.getPairIndex()
+    rows = pairIndex.rows()
+    shared = (companies[rows] == companies[pairIndex.indices]) & (companies[rows] >= 0)
+    evaluation.coCompanyPenalty = float(pairIndex.selfPenalty + np.sum(pairIndex.penalty[shared]))
+    evaluation.total += evaluation.coCompanyPenalty
+
+    #  ATTRIBUTE LIMITS
+    for limitTuple in problem.attributeLimitsList:
+        attrId, min, max, enableVector = limitTuple[:4]
+        attribute = problem.attributeList[attrId]
+        sums = ASM[:, attrId, :]
+        violation = (np.maximum(0, min - sums) + np.maximum(0, sums - max)) * (np.asarray(enableVector) != 0)
+        if len(limitTuple) > 4:
+            cost = float(limitTuple[4] * np.sum(violation))
+            evaluation.softLimits.append((attribute, min, max, cost))
+            evaluation.total += cost
+        else:
+            for compId, day in zip(*np.nonzero(violation > tolerance)):
+                evaluation.violations.append(f"{attribute} limit [{min}, {max}] violated in company {compId} on day {day}: {sums[compId, day]}")
+
+    #  COUPLINGS
+    for i, j, desiredProduct, softWeight in pairIndex.couplings:
+        share = int(companies[i] == companies[j] and companies[i] >= 0)
+        kind = "together" if desiredProduct == 1 else "apart"
+        if softWeight is None:
+            if share != desiredProduct:
+                evaluation.violations.append(f"{personList[i].name} and {personList[j].name} should be kept {kind}")
+        else:
+            cost = float(softWeight * (share != desiredProduct))
+            evaluation.softCouplings.append((personList[i].name, personList[j].name, kind, cost))
+            evaluation.total += cost
+
+    #  FIXINGS
+    for j, fix in enumerate(problem.companyFixList):
+        if fix is not None and companies[j] != fix:
+            evaluation.violations.append(f"{personList[j].name} is fixed to company {fix}, but placed in {companies[j]}")
+
+    return evaluation
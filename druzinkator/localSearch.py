@@ -0,0 +1,260 @@
+
+import numpy as np
+import scipy.sparse as sp
+import logging as log
+import time
+
+from .dataObjects import *
+from .matrixUtils import *
+from .evaluate import evaluateAssignment
+
+from typing import List
+
+
+class LocalSearchState:
+    """
+    Company vector of all persons together with everything needed to evaluate moves incrementally.
+
+    Uses the same cost terms as optimize(): weighed absolute attribute errors, co-company penalties times days of
+    presence overlap, attribute limits and personal couplings.  Hard limits and couplings are penalized by @hardPenalty
+    per unit of violation instead of being enforced.
+
+    ASM : companies by attributes by days.  Sum of attributes present in each company.
+    NP : persons by companies.  Sum of pair weights (co-company penalties and couplings) between a person and each company.
+    companyCosts : attribute error and limit cost of each company.
+    """
+
+    def __init__(self, problem : Problem, companies : np.array, hardPenalty = 1e4) -> None:
+        personList = problem.personList
+        attributeList = problem.attributeList
+        personCount = len(personList)
+
+        derivedData = problem.getDerivedData()
+        self.companyCount = problem.companyCount
+        self.DIM = derivedData.DIM
+        self.DAT = derivedData.DAT     #persons by attributes by days
+
+        self.weights = np.zeros(self.DIM.shape)
+        for i, w in enumerate(problem.AAEweighs):
+            if w is not None:
+                self.weights[i, :] = w
+
+        #attribute limits, one row per limit
+        limits = problem.attributeLimitsList
+        self.limitAttributes = np.array([l[0] for l in limits], dtype=int)
+        self.limitMins = np.array([l[1] for l in limits], dtype=float).reshape(-1, 1)
+        self.limitMaxs = np.array([l[2] for l in limits], dtype=float).reshape(-1, 1)
+        self.limitWeights = np.array([l[4] if len(l) > 4 else hardPenalty for l in limits], dtype=float).reshape(-1, 1) \
+                            * np.array([l[3] for l in limits], dtype=float).reshape(len(limits), self.DIM.shape[1])
+
+        #pair weights.  W[i,j] is paid when i and j share a company.  Being kept together is rewarded instead,
+        #with the penalty for not sharing a company moved into a constant.
+        pairIndex = problem.getPairIndex()
+        self.constant = pairIndex.selfPenalty
+        rows = [pairIndex.rows()]
+        cols = [pairIndex.indices]
+        values = [pairIndex.penalty]
+        for i, j, desiredProduct, softWeight in pairIndex.couplings:
+            weight = hardPenalty if softWeight is None else softWeight
+            if desiredProduct == 1:
+                self.constant += weight
+                weight = -weight
+            rows.append([i])
+            cols.append([j])
+            values.append([weight])
+        upper = sp.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape = (personCount, personCount))
+        self.W = (upper + upper.T).tocsr()
+
+        self.fixed = np.array([c is not None for c in problem.companyFixList], dtype=bool)
+        self.setCompanies(companies)
+
+    def setCompanies(self, companies : np.array):
+        """
+        Recomputes all incremental structures from scratch for given company vector.
+        """
+        self.companies = np.array(companies, dtype=int)
+        onehot = np.zeros((len(self.companies), self.companyCount))
+        onehot[np.arange(len(self.companies)), self.companies] = 1
+        self.ASM = np.einsum('pc,pad->cad', onehot, self.DAT)
+        self.NP = np.asarray(self.W @ onehot)
+        self.companyCosts = self.companyCost(self.ASM)
+
+    def companyCost(self, ASM : np.array) -> np.array:
+        """
+        Attribute error and limit cost of companies given their attribute sums (...by attributes by days).
+        """
+        cost = np.sum(self.weights * np.abs(ASM - self.DIM), axis = (-2, -1))
+        if len(self.limitAttributes):
+            limited = ASM[..., self.limitAttributes, :]
+            violation = np.maximum(0, self.limitMins - limited) + np.maximum(0, limited - self.limitMaxs)
+            cost += np.sum(self.limitWeights * violation, axis = (-2, -1))
+        return cost
+
+    def cost(self) -> float:
+        pairCost = 0.5 * np.sum(self.NP[np.arange(len(self.companies)), self.companies])
+        return float(np.sum(self.companyCosts) + pairCost + self.constant)
+
+    def pairWeight(self, i : int, j : int) -> float:
+        start, end = self.W.indptr[i], self.W.indptr[i+1]
+        k = start + np.searchsorted(self.W.indices[start:end], j)
+        if k < end and self.W.indices[k] == j:
+            return self.W.data[k]
+        return 0.0
+
+    def moveDeltas(self, i : int) -> tuple:
+        """
+        Returns change of cost for moving person i into each of the companies, together with the new company costs
+        of source and targets.
+        """
+        a = self.companies[i]
+        removed = self.companyCost(self.ASM[a] - self.DAT[i])
+        added = self.companyCost(self.ASM + self.DAT[i])
+        deltas = (removed - self.companyCosts[a]) + (added - self.companyCosts) + (self.NP[i] - self.NP[i, a])
+        deltas[a] = 0
+        return deltas, removed, added
+
+    def move(self, i : int, b : int, removed : float = None, added : float = None):
+        a = self.companies[i]
+        if a == b:
+            return
+        self.ASM[a] -= self.DAT[i]
+        self.ASM[b] += self.DAT[i]
+        self.companyCosts[a] = self.companyCost(self.ASM[a]) if removed is None else removed
+        self.companyCosts[b] = self.companyCost(self.ASM[b]) if added is None else added
+        self.updateNeighbours(i, a, b)
+        self.companies[i] = b
+
+    def swapDelta(self, i : int, j : int) -> tuple:
+        a, b = self.companies[i], self.companies[j]
+        difference = self.DAT[j] - self.DAT[i]
+        newA = self.companyCost(self.ASM[a] + difference)
+        newB = self.companyCost(self.ASM[b] - difference)
+        wij = self.pairWeight(i, j)
+        delta = newA - self.companyCosts[a] + newB - self.companyCosts[b] \
+                + (self.NP[i, b] - wij - self.NP[i, a]) + (self.NP[j, a] - wij - self.NP[j, b])
+        return delta, newA, newB
+
+    def swap(self, i : int, j : int, newA : float, newB : float):
+        a, b = self.companies[i], self.companies[j]
+        difference = self.DAT[j] - self.DAT[i]
+        self.ASM[a] += difference
+        self.ASM[b] -= difference
+        self.companyCosts[a] = newA
+        self.companyCosts[b] = newB
+        self.updateNeighbours(i, a, b)
+        self.companies[i] = b
+        self.updateNeighbours(j, b, a)
+        self.companies[j] = a
+
+    def updateNeighbours(self, i : int, a : int, b : int):
+        start, end = self.W.indptr[i], self.W.indptr[i+1]
+        neighbours = self.W.indices[start:end]
+        weights = self.W.data[start:end]
+        self.NP[neighbours, a] -= weights
+        self.NP[neighbours, b] += weights
+
+
+def checkHardConstraints(problem : Problem, companies : np.array, strict = False):
+    """
+    Warns (or raises an Exception if @strict) when company vector @companies violates hard constraints of @problem.
+    """
+    evaluation = evaluateAssignment(problem, companies)
+    if evaluation.isFeasible():
+        return
+    message = f"Local search result violates {len(evaluation.violations)} hard constraints: " + "; ".join(evaluation.violations)
+    if strict:
+        raise Exception(message)
+    log.warning(message)
+
+
+def localSearch(problem : Problem, maxtime = 10, maxMoves = None, initial = None, seed = None,
+                swapProbability = 0.3, startTemperature = None, endTemperature = 0.01, hardPenalty = 1e4, shouldStop = None,
+                strict = False) -> Assignment:
+    """
+    Finds a good assignment to companies by simulated annealing over move (one person changes company) and swap
+    (two persons in different companies trade places) neighborhoods.  Does not need SCIP, and can be stopped at any
+    time: the best assignment found so far is returned.  Hard constraints are only penalized, so the result is checked
+    by evaluateAssignment() and violations are logged as a warning (or raised, see @strict).
+
+    Params:
+    ---------
+    problem : Problem to solve.  Fixed persons (companyFixList) are never moved.
+    maxtime : time limit in seconds
+    maxMoves : optional limit on number of attempted moves.  At least one of maxtime and maxMoves must be set.
+    initial : optional starting point.  Assignment, [problem, result] list or path to saved result, see warmStartCompanies().
+        If not given, persons are placed greedily.
+    seed : seed of the random generator, for reproducible runs
+    swapProbability : probability of trying a swap instead of a move
+    startTemperature : initial temperature of annealing.  Estimated from average cost change of random moves if None.
+    endTemperature : temperature reached at the time (or move) limit, cooling is geometric
+    hardPenalty : penalty per unit of violation of hard limits and hard couplings
+    shouldStop : optional function without arguments, polled every 1000 moves.  The search ends when it returns True.
+    strict : if True, an Exception is raised when the best assignment found violates hard constraints
+    """
+    if maxtime is None and maxMoves is None:
+        raise ValueError("localSearch needs a limit, set maxtime or maxMoves.")
+
+    rng = np.random.default_rng(seed)
+    personCount = len(problem.personList)
+
+    state = LocalSearchState(problem, warmStartCompanies(problem, initial), hardPenalty)
+    freePeople = np.flatnonzero(~state.fixed)
+    if len(freePeople) == 0:
+        checkHardConstraints(problem, state.companies, strict)
+        return companyVectorToAssignment(problem.personList, state.companies, problem.companyCount)
+
+    if startTemperature is None:
+        samples = [np.mean(np.abs(state.moveDeltas(i)[0])) for i in rng.choice(freePeople, size = min(50, len(freePeople)))]
+        startTemperature = max(np.mean(samples), endTemperature)
+
+    cost = state.cost()
+    bestCost = cost
+    bestCompanies = state.companies.copy()
+
+    startTime = time.perf_counter()
+    moves = 0
+    accepted = 0
+    temperature = startTemperature
+    while True:
+        elapsed = time.perf_counter() - startTime
+        progress = elapsed / maxtime if maxtime is not None else 0
+        if maxMoves is not None:
+            progress = max(progress, moves / maxMoves)
+        if progress >= 1:
+            break
+        if moves % 100 == 0:
+            temperature = startTemperature * (endTemperature / startTemperature) ** progress
+        if moves % 1000 == 0 and shouldStop is not None and shouldStop():
+            break
+        moves += 1
+
+        i = freePeople[rng.integers(len(freePeople))]
+        if rng.random() < swapProbability and len(freePeople) > 1:
+            j = freePeople[rng.integers(len(freePeople))]
+            if state.companies[i] == state.companies[j]:
+                continue
+            delta, newA, newB = state.swapDelta(i, j)
+            if delta < 0 or rng.random() < np.exp(-delta / temperature):
+                state.swap(i, j, newA, newB)
+                cost += delta
+                accepted += 1
+        else:
+            b = rng.integers(problem.companyCount - 1)
+            b += (b >= state.companies[i])      #any company but the current one
+            deltas, removed, added = state.moveDeltas(i)
+            delta = deltas[b]
+            if delta < 0 or rng.random() < np.exp(-delta / temperature):
+                state.move(i, b, removed, added[b])
+                cost += delta
+                accepted += 1
+
+        if cost < bestCost - 1e-9:
+            bestCost = cost
+            bestCompanies = state.companies.copy()
+
+    elapsed = time.perf_counter() - startTime
+    state.setCompanies(bestCompanies)
+    print(f"Local search: {moves} moves ({moves / max(elapsed, 1e-9):.0f}/s), {accepted} accepted, best cost {state.cost():.2f}")
+
+    checkHardConstraints(problem, bestCompanies, strict)
+    return companyVectorToAssignment(problem.personList, bestCompanies, problem.companyCount)
@@ -1,15 +1,28 @@
 from openpyxl import load_workbook
 import numpy as np
+import hashlib
+import os
+import scipy.sparse as sp
 import logging as log
 
 from typing import List, Dict
 
 from .dataObjects import *
+from .utils import normalizeName
+from .resultFile import loadProblemAndAssignment
 
-def vojtaToHistoryMatrix(filename, ignoreYears = 0):
+
+#version of the parsing rules and format of cached history matrices.  Bump whenever vojtaToHistoryMatrix() changes
+#what it produces, so that caches written by older versions are rebuilt instead of loaded.
+HISTORY_CACHE_VERSION = 1
+
+def vojtaToHistoryMatrix(filename, ignoreYears = 0, cacheDir = ".druzinkator_cache"):
     """
     Convert Vojta's excel table into a history matrix and list of names.
     Logs warnings if something seems off about the data.
+    The workbook is streamed in read-only mode, touching each cell once.  The result is cached in @cacheDir, keyed on
+    the content hash of the workbook, ignoreYears and HISTORY_CACHE_VERSION, so that repeated runs do not parse the
+    workbook again.
 
     Params:
     ---
@@ -17,6 +30,8 @@ def vojtaToHistoryMatrix(filename, ignoreYears = 0):
         Filename of Vojta's excel table, downloaded to this folder.
     ignoreYears : int
         Optional.  Used to ignore last N years (for solving past camps)
+    cacheDir : string
+        Optional.  Folder for cached history matrices.  Set to None to disable caching.
 
     Returns:
     ---
@@ -29,58 +44,81 @@ def vojtaToHistoryMatrix(filename, ignoreYears = 0):
     birthYearDict : dict
         Dictionary mapping person names to birthyears (where known)
     """
-    excel = load_workbook(filename=f"./{filename}")
+    path = filename if os.path.isabs(filename) else f"./{filename}"
+
+    cacheFile = None
+    if cacheDir is not None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha.update(chunk)
+        cacheFile = os.path.join(cacheDir, f"history_v{HISTORY_CACHE_VERSION}_{sha.hexdigest()}_{ignoreYears}.npz")
+        if os.path.exists(cacheFile):
+            with np.load(cacheFile) as cached:
+                version = int(cached["cacheVersion"]) if "cacheVersion" in cached.files else None
+                if version == HISTORY_CACHE_VERSION:
+                    personNameList = cached["personNames"].tolist()
+                    historyMatrix = cached["historyMatrix"]
+                    birthYearDict = dict(zip(cached["birthYearNames"].tolist(), cached["birthYears"].tolist()))
+            if version == HISTORY_CACHE_VERSION:
+                log.info(f"Loaded history of {filename} from cache {cacheFile}")
+                return personNameList, historyMatrix, birthYearDict
+            log.info(f"Cache {cacheFile} has version {version} instead of {HISTORY_CACHE_VERSION}, parsing {filename} again")
+
+    excel = load_workbook(filename=path, read_only=True)
     sheet = excel["STATISTIKA"]
-
-    cols = [[cell.value for cell in column] for column in sheet.columns]
-    rows = [[cell.value for cell in row   ] for row    in sheet.rows   ]
+    rowIterator = sheet.iter_rows(values_only=True)
+    header = list(next(rowIterator))
+    columnCount = max(sheet.max_column or 0, len(header))
+    header += [None] * (columnCount - len(header))
 
     COMPANY_NAME_BLACKLIST = ["ved a kuch", "návštěva", "dětská", "dítě", "družinka"]   #strings that are not valid company names
     #per Vojta: Druzinka means person was in a company, but it is not known which one.  Therefore removing
 
     #this might need updating should the structure of Vojta's excel change
     COL_YEAR_FIRST = 7                  
-    COL_YEAR_LAST = len(rows[0]) - (3 + ignoreYears)
+    COL_YEAR_LAST = columnCount - (3 + ignoreYears)
     COL_SURNAME = 0                     
     COL_NAME = 2                        
     COL_BIRTHYEAR = 3
     ROW_PERSON_FIRST = 11
-    ROW_PERSON_LAST = len(cols[0]) - 1
     YEARS_TOTAL = COL_YEAR_LAST - COL_YEAR_FIRST + 1
-    PERSONS_TOTAL = ROW_PERSON_LAST - ROW_PERSON_FIRST + 1
-    
 
     #prepare translation from companies to ints. Intended mapping: valid companies -> {1,2,3,4}, kitchen/org/visits/not present -> 0
     #reason: save some computation time when comparing each pair to see if they shared company (int comparision instead of string comp.)
+    #companies are numbered in order of first appearance within each year's column
     compDicts =  [{} for i in range(YEARS_TOTAL)]
-    for i, col in enumerate(cols[COL_YEAR_FIRST:COL_YEAR_LAST+1]):
-        d = compDicts[i]
-        for cell in col[ROW_PERSON_FIRST:]:
-            if isinstance(cell, str) and len(cell) > 0:
-                if cell not in COMPANY_NAME_BLACKLIST and cell not in d.keys():
-                    count = len(d.keys()) + 1
-                    d[cell] = count
-
-    historyMatrix = np.zeros((PERSONS_TOTAL, YEARS_TOTAL))
-
-    for year in range(YEARS_TOTAL):
-        d = compDicts[year]
-        yearCol = cols[COL_YEAR_FIRST + year]
-        for person in range(PERSONS_TOTAL):
-            result = d.get(yearCol[ROW_PERSON_FIRST + person])
-            if result: 
-                historyMatrix[person, year] = result
 
+    historyRows = []
     personNameList = []
     birthYearDict = {}
-    for i in range(PERSONS_TOTAL):
-        joinedName = cols[COL_NAME][ROW_PERSON_FIRST+i] + " " + cols[COL_SURNAME][ROW_PERSON_FIRST+i]
+    for rowIndex, row in enumerate(rowIterator, start = 1):
+        if rowIndex < ROW_PERSON_FIRST:
+            continue
+        row = list(row) + [None] * (columnCount - len(row))
+
+        historyRow = [0] * YEARS_TOTAL
+        for year, cell in enumerate(row[COL_YEAR_FIRST:COL_YEAR_LAST+1]):
+            if isinstance(cell, str) and len(cell) > 0 and cell not in COMPANY_NAME_BLACKLIST:
+                d = compDicts[year]
+                result = d.get(cell)
+                if result is None:
+                    result = len(d) + 1
+                    d[cell] = result
+                historyRow[year] = result
+        historyRows.append(historyRow)
+
+        joinedName = row[COL_NAME] + " " + row[COL_SURNAME]
         personNameList.append(joinedName)
         #ain't nobody got time for maiden names, sorry
-        birthYearFromVojta = cols[COL_BIRTHYEAR][ROW_PERSON_FIRST+i]
+        birthYearFromVojta = row[COL_BIRTHYEAR]
         if isinstance(birthYearFromVojta, int):
             birthYearDict[joinedName] = birthYearFromVojta
 
+    excel.close()
+
+    historyMatrix = np.array(historyRows, dtype=float).reshape(len(historyRows), YEARS_TOTAL)
+
     #check for anomalies and log them
     incompleteYears = []
     for i, d in enumerate(compDicts):
@@ -88,28 +126,112 @@ def vojtaToHistoryMatrix(filename, ignoreYears = 0):
         if l < 4:
             incompleteYears.append(i)
         elif l > 4:
-            y = rows[0][COL_YEAR_FIRST+i]
+            y = header[COL_YEAR_FIRST+i]
             log.warning(f"Year {y} contains too many ({l}) companies! Dictionary follows: \n {d}")
     log.info(f'''Incomplete data (fewer than 4 companies found) for following years:
-              {[rows[0][COL_YEAR_FIRST+i] for i in incompleteYears]}''')
+              {[header[COL_YEAR_FIRST+i] for i in incompleteYears]}''')
 
-    
+    if cacheFile is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmpFile = cacheFile + ".tmp.npz"
+        np.savez(tmpFile, cacheVersion = HISTORY_CACHE_VERSION, personNames = np.array(personNameList, dtype=str), historyMatrix = historyMatrix,
+                 birthYearNames = np.array(list(birthYearDict.keys()), dtype=str), 
+                 birthYears = np.array(list(birthYearDict.values()), dtype=int))
+        os.replace(tmpFile, cacheFile)
 
     return personNameList, historyMatrix, birthYearDict
 
-def vojtaNameListToDict(personList : list[Person], vojtaNameList : list[str]) -> Dict[str, int]:
+class HistoryNameIndex:
+    """
+    Index over names from Vojta's history for matching them to persons of this year's camp.
+    Built once over the whole history name list.  Offers O(1) lookups of exact names and of names normalized via 
+    utils.normalizeName(), plus a trigram index for suggesting likely matches of names which were not found at all.
+    """
+
+    def __init__(self, vojtaNameList : List[str]) -> None:
+        self.names = vojtaNameList
+        self.exactDict = {}
+        self.normalizedDict = {}
+        for i, vName in enumerate(vojtaNameList):
+            self.exactDict[vName] = i       #in case of duplicates, the last row wins
+            self.normalizedDict.setdefault(normalizeName(vName), []).append(i)
+
+        self.keys = list(self.normalizedDict.keys())
+        self.trigramDict = {}
+        for keyId, key in enumerate(self.keys):
+            for trigram in HistoryNameIndex.trigrams(key):
+                self.trigramDict.setdefault(trigram, []).append(keyId)
+
+    @staticmethod
+    def trigrams(key : str) -> set:
+        padded = f"  {key} "
+        return set(padded[i:i+3] for i in range(len(padded) - 2))
+
+    def lookup(self, name : str) -> int:
+        """
+        Returns row of @name in history, or None if it was not found.  Exact matches take precedence, then normalized
+        names are tried, as long as the normalized name is not shared by several rows.
+        """
+        row = self.exactDict.get(name, None)
+        if row is not None:
+            return row
+        rows = self.normalizedDict.get(normalizeName(name), [])
+        if len(rows) == 1:
+            return rows[0]
+        return None
+
+    def candidates(self, name : str, count = 3, minSimilarity = 0.5) -> List[tuple]:
+        """
+        Returns up to @count history names most similar to @name, as list of (name, similarity) tuples.
+        Similarity is the Jaccard index of the sets of trigrams of normalized names.
+        """
+        queryTrigrams = HistoryNameIndex.trigrams(normalizeName(name))
+        shared = {}
+        for trigram in queryTrigrams:
+            for keyId in self.trigramDict.get(trigram, []):
+                shared[keyId] = shared.get(keyId, 0) + 1
+
+        scored = []
+        for keyId, sharedCount in shared.items():
+            keyTrigramCount = len(HistoryNameIndex.trigrams(self.keys[keyId]))
+            similarity = sharedCount / (len(queryTrigrams) + keyTrigramCount - sharedCount)
+            if similarity >= minSimilarity:
+                scored.append((similarity, keyId))
+        scored.sort(reverse = True)
+
+        result = []
+        for similarity, keyId in scored[:count]:
+            for row in self.normalizedDict[self.keys[keyId]]:
+                result.append((self.names[row], similarity))
+        return result[:count]
+
+
+def vojtaNameListToDict(personList : list[Person], vojtaNameList : list[str], nameIndex : HistoryNameIndex = None) -> Dict[str, int]:
     """
-    Generates a dictionary mapping current year's personNameList to vojta's historymatrix
+    Generates a dictionary mapping current year's personNameList to vojta's historymatrix.
+    Names are matched exactly or up to diacritics, case and whitespace (see HistoryNameIndex).  Prints persons matched 
+    only after normalization, and likely history names for persons that were not matched at all.
+    If @nameIndex is not supplied, it is built from @vojtaNameList.
     """
+    if nameIndex is None:
+        nameIndex = HistoryNameIndex(vojtaNameList)
+
     vojtaNameDict = {}
-    for i, vName in enumerate(vojtaNameList):
-        for person in personList:
-            if person.name == vName:
-                vojtaNameDict[person.name] = i
+    for person in personList:
+        row = nameIndex.lookup(person.name)
+        if row is not None:
+            vojtaNameDict[person.name] = row
+            if nameIndex.names[row] != person.name:
+                print(f"Matched {person.name} to {nameIndex.names[row]} in Vojta's database")
+            continue
+        candidates = nameIndex.candidates(person.name)
+        if candidates:
+            print(f"{person.name} not found in Vojta's database.  Did you mean {[c[0] for c in candidates]}?")
     return vojtaNameDict
 
 
-def historyToCoCoPenaltyMatrix(historyMatrix : np.matrix, vojtaNameDict : Dict[str,int], personList : List[Person], penaltyVector : np.array):
+def historyToCoCoPenaltyMatrix(historyMatrix : np.matrix, vojtaNameDict : Dict[str,int], personList : List[Person], penaltyVector : np.array = None, sparse = False,
+                               penaltyVectors : List[np.array] = None):
     """
     Converts a history matrix into CoCompany Penalty Matrix (CCPM).
 
@@ -117,7 +239,10 @@ def historyToCoCoPenaltyMatrix(historyMatrix : np.matrix, vojtaNameDict : Dict[s
     historyMatrix, vojtaPersonNameList : outputs from vojtaToHistoryMatrix()
     personList : list of people for which to generate CCPM
     penaltyVector : vector of penalty values for sharing a company.  Number of elements corresponds to number of years into the past that
-        are taken into account, starting with last year.
+        are taken into account, starting with last year.  Any 1D sequence (list, tuple, array) is a single vector.
+    sparse : if True, CCPM is returned as a scipy.sparse csr matrix instead of a dense one.
+    penaltyVectors : instead of @penaltyVector, a list of penalty vectors (or a 2D array with one vector per row).  A list of CCPMs is
+        then returned, one per vector.  The per-year products are computed only once for all of them.
 
     returns:
     CCPM : x by x numpy matrix, where x is len(personList).  Intersection of ith row and jth column holds the penalty that will be applied if
@@ -147,32 +272,56 @@ def historyToCoCoPenaltyMatrix(historyMatrix : np.matrix, vojtaNameDict : Dict[s
 
     print(f"Following persons did NOT match anyone in Vojta's database:  {assumedNewbies}")
 
-    CCPM = np.zeros((len(personList), len(personList)))
-
-    #fill out CCPM.
-    #this could be twice as fast with diagonal flip but whatever
-    for i, rowPerson in enumerate(personList):
-        vojtaI = vojtaNameDict.get(rowPerson.name, None)
-        if vojtaI is None:
-            continue        #rowPerson not in history -> wont have any penalties
-        for j, colPerson in enumerate(personList):
-            if j == i:
-                continue    #don't penalize being in same company as yourself
-            vojtaJ = vojtaNameDict.get(colPerson.name, None)
-            if vojtaJ is None:
-                continue
-            
-            #if we reached thus far both rowPerson and colPerson exist in vojta records, calculate penalty
-            hIndex = -1
-            penalty = 0
-            for p in penaltyVector:
-                if historyMatrix[vojtaI, hIndex] == historyMatrix[vojtaJ, hIndex]:
-                    penalty += p
-                hIndex -= 1         #let's just assume nobody will look far enough into the past for this to fail
-
-            CCPM[i,j] = penalty
-
-    return CCPM
+    if (penaltyVector is None) == (penaltyVectors is None):
+        raise Exception("Give exactly one of penaltyVector and penaltyVectors.")
+    multiple = penaltyVectors is not None
+    if not multiple:
+        penaltyVectors = [penaltyVector]
+    penaltyVector = [np.asarray(p, dtype=float).flatten() for p in penaltyVectors]
+    yearsBack = max([len(p) for p in penaltyVector], default = 0)
+    if yearsBack > historyMatrix.shape[1]:
+        log.warning(f"Penalty vector reaches {yearsBack} years back, but history only has {historyMatrix.shape[1]} years.  Ignoring the rest.")
+        yearsBack = historyMatrix.shape[1]
+    penaltyMatrix = np.zeros((len(penaltyVector), yearsBack))
+    for k, p in enumerate(penaltyVector):
+        penaltyMatrix[k, :min(len(p), yearsBack)] = p[:yearsBack]
+
+    personCount = len(personList)
+    matchedPersons = []
+    matchedRows = []
+    for i, person in enumerate(personList):
+        vojtaI = vojtaNameDict.get(person.name, None)
+        if vojtaI is not None:      #persons not in history -> wont have any penalties
+            matchedPersons.append(i)
+            matchedRows.append(vojtaI)
+    matchedPersons = np.array(matchedPersons, dtype=int)
+    matchedRows = np.array(matchedRows, dtype=int)
+
+    #encode each year as one-hot company membership H (person by company).  H @ H.T then holds 1 for pairs that shared a company that year.
+    #only the strict upper triangle is kept -- CCPM is symmetric and nobody is penalized for being in the same company as themselves
+    yearProducts = []
+    for hIndex in range(1, yearsBack + 1):
+        companies = historyMatrix[matchedRows, -hIndex].astype(int)
+        inCompany = companies > 0       #zero means not in a recognised company, which is not shared with anybody
+        companies = companies[inCompany]
+        H = sp.csr_matrix((np.ones(len(companies)), (matchedPersons[inCompany], companies - 1)), 
+                          shape = (personCount, companies.max(initial = 0)))
+        yearProducts.append(sp.triu(H @ H.T, k = 1).tocsr())
+
+    CCPMs = []
+    for penalties in penaltyMatrix:
+        upper = sp.csr_matrix((personCount, personCount))
+        for p, product in zip(penalties, yearProducts):
+            if p != 0:
+                upper = upper + p * product
+        CCPM = (upper + upper.T).tocsr()
+        if not sparse:
+            CCPM = CCPM.toarray()
+        CCPMs.append(CCPM)
+
+    if multiple:
+        return CCPMs
+    return CCPMs[0]
 
 
 
@@ -188,30 +337,75 @@ def calculateDailyMatrices(personList : List[Person], attributeList : List[str])
     attributeList : list of strings. Specified attributes to be taken into account.
     ---------------
     returns:
-    DSM : matrix, len(attributeList) by 14. Daily sum matrix. Rows contain sums of attributes present on that day, one row per attribute.
-    DAM_list : List of len(attributeList) matrices. Each matrix within list has dimensions len(personList) by 14.  
+    DSM : matrix, len(attributeList) by number of days. Daily sum matrix. Rows contain sums of attributes present on that day, one row per attribute.
+    DAM_list : List of len(attributeList) matrices. Each matrix within list has dimensions len(personList) by number of days.  
         Cell contains value of that person's attribute, if person is present on that day.  If person is not present on that day, cell contains 0.
+    Matrices are read only views into DerivedData.DAT.  For persons of a Problem, use Problem.getDailyMatrices(), 
+    which caches the result.
     """
-    vl = []
-    for p in personList:
-        vl.append([p.presence])
-    DPM = np.block(vl)
-
-    DAM_list = []
-    for attr in attributeList:
-        DAM = DPM.copy()
-        DAM_list.append(DAM)
-        for i,p in enumerate(personList):
-            aval = p.get(attr)
-            DAM[i, :] *= aval
-
-    DSM = np.zeros((len(attributeList), 14))
-    for i, DAM in enumerate(DAM_list):
-        DSM[i, :] = DAM.sum(axis = 0)
-
-    return DSM, DAM_list
+    derivedData = DerivedData(personList, attributeList)
+    return derivedData.DSM, derivedData.DAM_list()
     
 
+def warmStartCompanies(problem : Problem, oldAssignment) -> np.array:
+    """
+    Returns a vector holding company of each person of @problem, taken from @oldAssignment by name.
+    @oldAssignment may be an Assignment, a [problem, result] list, a path to a result saved by exampleSetup.py (.npz 
+    archive or legacy pickle)
+    or None (everybody is then placed greedily).
+    Fixings in problem.companyFixList take precedence over the old assignment.
+    Newcomers are placed greedily: to the company of a hard keepTogether partner if one is placed already, otherwise to the 
+    company where they add least to the squared daily manpower.
+    """
+    if isinstance(oldAssignment, str):
+        oldAssignment = loadProblemAndAssignment(oldAssignment)[1]
+    if isinstance(oldAssignment, (list, tuple)):
+        oldAssignment = oldAssignment[1]
+
+    personList = problem.personList
+    companies = np.full(len(personList), -1, dtype=int)
+    for j, person in enumerate(personList):
+        company = problem.companyFixList[j]
+        if company is None and oldAssignment is not None:
+            company = oldAssignment.getCompanyByName(person.name)
+        if company is not None:
+            companies[j] = company
+
+    table, rows = problem.getPersonTable()
+    P = table.presence[rows]
+    dailyManpower = np.zeros((problem.companyCount, problem.dayCount))
+    placed = np.flatnonzero(companies >= 0)
+    np.add.at(dailyManpower, companies[placed], P[placed])
+
+    partners = {}
+    for coupling in problem.personalCouplingList:
+        if len(coupling) == 3 and coupling[2] == 1:
+            i, j = problem.personDict[coupling[0].name], problem.personDict[coupling[1].name]
+            partners.setdefault(i, []).append(j)
+            partners.setdefault(j, []).append(i)
+
+    for j in np.flatnonzero(companies < 0):
+        placedPartners = [k for k in partners.get(j, []) if companies[k] >= 0]
+        if placedPartners:
+            company = companies[placedPartners[0]]
+        else:
+            company = np.argmin(np.sum((dailyManpower + P[j])**2 - dailyManpower**2, axis = 1))
+        companies[j] = company
+        dailyManpower[company] += P[j]
+
+    if oldAssignment is not None:
+        newcomers = [person.name for person in personList if oldAssignment.getCompanyByName(person.name) is None]
+        print(f"Warm start: {len(personList) - len(newcomers)} persons taken from old assignment, newcomers placed greedily: {newcomers}")
+
+    return companies
+
+
+def companyVectorToAssignment(personList : List[Person], companies : np.array, companyCount : int = DEFAULT_COMPANY_COUNT) -> Assignment:
+    """
+    Builds an Assignment out of a vector holding company index of each person.
+    """
+    return Assignment.fromCompanyVector(personList, companies, companyCount)
+
 def autoRarasek(personList : List[Person], historyMatrix : np.matrix, vojtaNameDict : Dict[str, int], requiredYears = 2, requiredPresence = 13, rarasekStr = "rarasek"):
     """
     Automatically assigns the "rarasek" attribute to people meeting criteria.
@@ -223,22 +417,17 @@ def autoRarasek(personList : List[Person], historyMatrix : np.matrix, vojtaNameD
     requiredPresence : int.  Number of days that must be 1 in person's presence vector to make person eligible for rarasek
     rarasekStr : str.  String representing the attribute that will be bestowed upon those found worthy
     """
-    
-    for person in personList:
-        presence = np.sum(person.presence)
-        if presence < requiredPresence:
-            continue
-        personRow = vojtaNameDict.get(person.name, None)
-        if personRow is None:
-            continue
-        experience = 0
-        for i in range(historyMatrix.shape[1]):
-            if historyMatrix[personRow, i]:
-                experience += 1
-                if experience >= requiredYears:
-                    person.set(rarasekStr)
-                    print(f"{person.name} is worthy.")
-                    break
+    table, rows = PersonTable.rowsOf(personList)
+    presence = table.presence[rows].sum(axis = 1)
+    historyRows = np.array([vojtaNameDict.get(person.name, -1) for person in personList], dtype=int)
+    experience = np.count_nonzero(np.asarray(historyMatrix), axis = 1)
+
+    known = historyRows >= 0
+    worthy = np.zeros(len(personList), dtype=bool)
+    worthy[known] = (presence[known] >= requiredPresence) & (experience[historyRows[known]] >= requiredYears)
+    for j in np.flatnonzero(worthy):
+        personList[j].set(rarasekStr)
+        print(f"{personList[j].name} is worthy.")
 
 def autoNovacek(personList : List[Person], historyMatrix : np.matrix, vojtaNameDict : Dict[str, int], novacekStr = "novacek"):
     """
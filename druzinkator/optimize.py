@@ -1,24 +1,70 @@
 
-from pyscipopt import Model
+from pyscipopt import Model, Expr, ExprCons
+from pyscipopt.scip import Term
 import pyscipopt
 
 from .dataObjects import *
 from .visualize import visualizeAssignment
 from .matrixUtils import *
+from .profiling import PhaseProfiler, SolveStats, SolveResult
+from .progress import ProgressEventhdlr, JsonlProgressWriter, solutionCompanies
+from .snapshots import IncumbentSnapshots
+from .presolve import Units
 
 
 import numpy as np
 import scipy.sparse as sp
+import logging as log
+import time
 
 
 from typing import List
 
-def optimize(problem : Problem, oldAssignment : Assignment = None, maxtime = None) -> Assignment:
+def optimize(problem : Problem, oldAssignment : Assignment = None, maxtime = None, formulation = "linear", symmetryBreaking = "anchor",
+             modelHook = None, returnStats = False, statsFile : str = None, anonymousNames = False, progressCallback = None,
+             progressFile : str = None, snapshotDir : str = None, snapshotFormat = "npz", aggregatePeople = True,
+             contractTogether = True):
     """
     Finds optimal assignment to companies according to people, constraints, weighs etc. described by problem.
-    If the oldAssignment argument is set, then assignments present in oldAssignment will be fixed.
+    If the oldAssignment argument is set, it is used as a starting solution for the solver.  It may be an Assignment, the 
+    [problem, result] list, or a path to a result saved by exampleSetup.py --outpickle.  People are matched by name,
+    see warmStartCompanies().  To actually fix people in their old companies, use Problem.fixPeopleFromOldAssignment().
+
+    formulation : "linear" or "quadratic"
+        "linear" (default) models shared companies with auxiliary variables and linking inequalities, so that SCIP
+        solves a pure MILP with the cost as a linear objective.
+        "quadratic" uses products of membership variables (the original formulation), kept for comparison.
+    symmetryBreaking : "anchor", "scip" or None
+        "anchor" (default) forbids free persons (units) from opening companies out of order, see addCompanySymmetryBreaking().
+        "scip" leaves symmetry handling to SCIP's default settings, None disables symmetry handling altogether.
+    modelHook : optional function called as modelHook(model, MM) right before solving.  Allows setting SCIP parameters
+        or including event handlers, see portfolio.py.  MM has a column per unit rather than per person, model.data
+        holds the Units (see solutionCompanies()).
+    returnStats : if True, returns a SolveResult holding the Assignment (or None) together with SolveStats: time,
+        memory and model size of each build phase and the final solver status, gap, bounds and node count.
+    statsFile : if set, SolveStats are also written to this file as JSON.
+    anonymousNames : if True, variables and constraints get SCIP's default names instead of descriptive ones,
+        which saves formatting strings for every row of a large model.
+    progressCallback : optional function called with a dict for every progress event of the solve (new incumbent with
+        its cost breakdown, dual bound change, end), see ProgressEventhdlr.
+    progressFile : if set, progress events are also written to this file, one JSON object per line.
+    aggregatePeople : if True (default), interchangeable persons are modelled together by integer counts, see Units.
+        If False, every person gets their own binary membership variables.
+    contractTogether : if True (default), persons joined by hard keepTogether couplings are modelled as a single node
+        instead of being coupled by constraints, see Units.  Contradicting keep apart couplings or fixings raise an Exception.
+    snapshotDir : if set, every incumbent found during the solve is saved into this directory as it is found, with
+        the best one always available as best.<snapshotFormat> ("npz" or "pkl"), see IncumbentSnapshots.
+
+    Returns the Assignment, or None if no assignment was found (unless returnStats is set).
     """
 
+    if formulation not in ["linear", "quadratic"]:
+        raise Exception(f"Unknown formulation '{formulation}'.  Use 'linear' or 'quadratic'.")
+    if symmetryBreaking not in ["anchor", "scip", None]:
+        raise Exception(f"Unknown symmetry breaking '{symmetryBreaking}'.  Use 'anchor', 'scip' or None.")
+
+    startTime = time.perf_counter()
+
     personList = problem.personList
     personDict = problem.personDict
     personCount = len(personList)
@@ -28,141 +74,393 @@ def optimize(problem : Problem, oldAssignment : Assignment = None, maxtime = Non
 
     attributeLimits = problem.attributeLimitsList
 
-    personalCouplingList = problem.personalCouplingList
-
     weightsList = problem.AAEweighs
-    CCPM = problem.CCPM
 
-    DSM, DAM_list = calculateDailyMatrices(personList, attributeList)
-    DIM = DSM/4 #daily ideal matrix. Holds ideal ammount of people and attributes per company per day
+    companyCount = problem.companyCount
+    dayCount = problem.dayCount
 
     model = Model("companies")
+    profiler = PhaseProfiler(model)
+
+    with profiler("dailyMatrices"):
+        derivedData = problem.getDerivedData()
+        DIM = derivedData.DIM #daily ideal matrix. Holds ideal ammount of people and attributes per company per day
+
+    #   DECISION UNITS
+    #       persons contracted by hard keepTogether, classes of interchangeable ones
+    with profiler("units"):
+        units = Units(problem, aggregatePeople, contractTogether)
+        DAM_list = units.DAM_list()
+        model.data = units
 
     #   MEMBERSHIP
-    MM = np.empty((4, personCount), dtype= pyscipopt.Variable)
-    for i in range(4):
-        for j in range(personCount):
-            MM[i,j] = model.addVar(name = f"Membership_{i}_{j}", vtype = 'B')
-
-    #add constaraint: each person is a member of exactly one company
-    msums = np.ones((1, 4)) @ MM
-    msums = msums[0]    #discard first axis of resulting 1 by personcount matrix
-    for i in range(personCount):
-        model.addCons(msums[i] == 1)
-
-    #add constraints: persons which are already assigned in oldAssignment remain in their respective companies.
-    for j in range(personCount):
-        companyFix = problem.companyFixList[j]
+    with profiler("membership"):
+        MM = addMembership(model, units, companyCount, anonymousNames)
+
+        #break symmetry between interchangeable companies
+        if symmetryBreaking == "anchor":
+            addCompanySymmetryBreaking(model, MM, units)
+        elif symmetryBreaking is None:
+            model.setParam('misc/usesymmetry', 0)
+
+    #seed the solver with the old assignment.  Only membership is given, SCIP completes the rest of the solution
+    if oldAssignment is not None:
+        with profiler("warmStart"):
+            companies = warmStartCompanies(problem, oldAssignment)
+            if symmetryBreaking == "anchor":
+                companies = canonicalCompanyVector(problem, companies, units)
+            counts = units.counts(companies, companyCount)
+            warmSol = model.createPartialSol()
+            for (i, u), count in np.ndenumerate(counts):
+                model.setSolVal(warmSol, MM[i,u], count)
+            model.addSol(warmSol)
+
+    #  ABSOLUTE ATTRIBUTE ERRORS
+    with profiler("AAE"):
+        AAEsum = addAbsoluteAttributeErrors(model, MM, DAM_list, DIM, weightsList, anonymousNames)
+
+    #  ATTRIBUTE LIMITS
+    with profiler("attributeLimits"):
+        softPenaltySum = addAttributeLimitConstraints(model, MM, DAM_list, attributeLimits, anonymousNames)
+
+
+    #  SHARED COMPANY
+    #       only pairs with a co-company penalty and shared days, or with a coupling, are ever modelled
+    with profiler("pairIndex"):
+        pairIndex = units.pairIndex
+
+    with profiler("CCP"):
+        if formulation == "quadratic":
+            CCPsum = addQuadraticCoCompanyPenalties(model, MM, pairIndex)
+        else:
+            CCPsum = addLinearCoCompanyPenalties(model, MM, pairIndex, anonymousNames)
+
+    with profiler("couplings"):
+        if formulation == "quadratic":
+            softPenaltySum += addQuadraticCouplings(model, MM, pairIndex)
+        else:
+            softPenaltySum += addLinearCouplings(model, MM, pairIndex, anonymousNames)
+
+
+    # -------------------------------------------
+
+    with profiler("objective"):
+        cost = AAEsum + CCPsum + softPenaltySum
+
+        if formulation == "quadratic":
+            #SCIP does not accept a nonlinear objective, move it into a constraint
+            objVar = model.addVar(name = "objectiveVariable")
+            model.addCons(objVar >= cost)
+            model.setObjective(objVar)
+        else:
+            model.setObjective(cost)
+
+    if not (maxtime is None):
+        model.setParam('limits/time', maxtime)
+
+    progressCallbacks = [c for c in [progressCallback] if c is not None]
+    progressWriter = None
+    if progressFile is not None:
+        progressWriter = JsonlProgressWriter(progressFile)
+        progressCallbacks.append(progressWriter)
+    if snapshotDir is not None:
+        progressCallbacks.append(IncumbentSnapshots(problem, snapshotDir, snapshotFormat))
+    progressHandler = None
+    if progressCallbacks:
+        progressHandler = ProgressEventhdlr(problem, MM, progressCallbacks, startTime, units = units)
+        model.includeEventhdlr(progressHandler, "progress", "reports incumbents and bounds during solve")
+
+    if modelHook is not None:
+        modelHook(model, MM)
+
+    stats = SolveStats(profiler.phases)
+    stats.variables = model.getNVars()
+    stats.constraints = model.getNConss()
+    stats.nonzeros = profiler.countNonzeros()
+
+    with profiler("solve"):
+        model.optimize()
+
+    if progressHandler is not None:
+        progressHandler.finish()
+    if progressWriter is not None:
+        progressWriter.close()
+
+    stats.readSolver(model)
+
+    result = None
+    status = stats.status
+    if status in ["infeasible", "inforunbd", "unbounded"]:
+        print(f"Could not find assignment. {status}")
+    elif status != "optimal" and model.getNSols() == 0:
+        #interrupted or stopped by a limit (time, gap, ...) before finding anything
+        print(f"No assignment found before the solver stopped. {status}")
+    else:
+        with profiler("extraction"):
+            #only membership is read back, shared companies follow from the company vector
+            companies = solutionCompanies(model, MM, units = units)
+            log.debug(f"Companies: {companies}")
+
+            result = Assignment.fromCompanyVector(personList, companies, companyCount)
+
+    stats.totalTime = time.perf_counter() - startTime
+    log.info(f"{stats}")
+    if statsFile is not None:
+        stats.saveJson(statsFile)
+
+    if returnStats:
+        return SolveResult(result, stats)
+    return result
+
+
+
+def addVariables(model : Model, shape, name : str, vtype = 'C', lb = 0.0, ub = None, anonymous = False) -> np.ndarray:
+    """
+    Adds an array of variables of given shape, named name_i_j... (or by SCIP's default names if anonymous).
+    vtype and ub may also be arrays broadcastable to shape.
+    """
+    variables = np.empty(shape, dtype=pyscipopt.Variable)
+    vtypes = np.broadcast_to(np.asarray(vtype), variables.shape)
+    ubs = np.broadcast_to(np.asarray(ub, dtype=object), variables.shape)
+    for index in np.ndindex(*variables.shape):
+        varName = "" if anonymous else name + "".join(f"_{i}" for i in index)
+        variables[index] = model.addVar(name = varName, vtype = str(vtypes[index]), lb = lb, ub = None if ubs[index] is None else float(ubs[index]))
+    return variables
+
+
+def linearExpr(coefficients, variables, constant = 0.0) -> Expr:
+    """
+    Returns the expression coefficients @ variables + constant, built directly from terms rather than by
+    arithmetic on pyscipopt objects.
+    """
+    terms = {Term(var) : float(coef) for var, coef in zip(variables, coefficients) if coef != 0}
+    if constant != 0:
+        terms[Term()] = float(constant)
+    return Expr(terms)
+
+
+def addLinearRows(model : Model, A, variables, lhs = None, rhs = None, name = "", anonymous = False) -> list:
+    """
+    Adds constraints lhs <= A @ variables <= rhs, one per row of sparse matrix A, in bulk.
+
+    Params:
+    ---------
+    A : scipy sparse matrix (or anything convertible to one), constraints by variables
+    variables : 1D array of pyscipopt variables, one per column of A
+    lhs, rhs : scalars or arrays with a value per row.  None or infinite values mean no bound.
+    name : constraints are named name_row, unless anonymous is set
+
+    Returns the list of added constraints.
+    """
+    A = sp.csr_matrix(A)
+    A.sum_duplicates()
+    rowCount = A.shape[0]
+    sides = []
+    for side in [lhs, rhs]:
+        side = np.broadcast_to(np.asarray(np.nan if side is None else side, dtype=float), rowCount)
+        sides.append([v if np.isfinite(v) else None for v in side.tolist()])
+    lhs, rhs = sides
+
+    terms = [Term(var) for var in variables]
+    indptr, indices, data = A.indptr.tolist(), A.indices.tolist(), A.data.tolist()
+    conss = []
+    for r in range(rowCount):
+        expr = Expr({terms[indices[k]] : data[k] for k in range(indptr[r], indptr[r+1])})
+        conss.append(model.addCons(ExprCons(expr, lhs = lhs[r], rhs = rhs[r]), name = "" if anonymous else f"{name}_{r}"))
+    return conss
+
+
+def addMembership(model : Model, units : Units, companyCount : int, anonymous = False) -> np.ndarray:
+    """
+    Adds membership matrix MM (companies by units) together with the constraints that each person is a 
+    member of exactly one company and that fixed persons are members of their companies.
+    Entries are binary for units of one person, integers counting members placed in the company for classes of interchangeable persons.
+    Variables of MM are flattened in row major order (MM.flatten()[c*unitCount + j] == MM[c,j]) by all bulk builders.
+    """
+    unitCount = units.unitCount
+    sizes = units.sizes
+
+    MM = addVariables(model, (companyCount, unitCount), "Membership", vtype = np.where(sizes == 1, 'B', 'I'), ub = sizes, anonymous = anonymous)
+
+    #each person is a member of exactly one company
+    oneCompany = sp.hstack([sp.identity(unitCount)] * companyCount)
+    addLinearRows(model, oneCompany, MM.flatten(), lhs = sizes, rhs = sizes, name = "OneCompany", anonymous = anonymous)
+
+    #persons which are already assigned (fixed) remain in their respective companies
+    for j, companyFix in enumerate(units.companyFixList):
         if companyFix is not None:
-            model.addCons(MM[companyFix, j] == 1)   
-            print(f"NEWCONS MM @ {companyFix}, {j} == 1")
+            model.chgVarLb(MM[companyFix, j], 1)
+            log.debug(f"Fixed MM @ {companyFix}, {j} == 1")
 
-    #  precalculate attribute sum matrices
-    ASM_list = []
-    for i, DAM in enumerate(DAM_list):
-        ASM = MM @ DAM 
-        ASM_list.append(ASM)
+    return MM
 
 
-    #  ABSOLUTE ATTRIBUTE ERRORS
-    AAEsum = 0
+def companyAttributeSums(DAM : np.array, companyCount : int, days : np.array) -> sp.csr_matrix:
+    """
+    Coefficients of the sums of an attribute in companies on given days in terms of MM.flatten(). 
+    Rows are ordered by company, then by day: row c*len(days) + k is the sum in company c on day days[k].
+    """
+    return sp.kron(sp.identity(companyCount), sp.csr_matrix(DAM[:, days].T), format = 'csr')
+
+
+def addAbsoluteAttributeErrors(model : Model, MM : np.ndarray, DAM_list : List[np.array], DIM : np.array, weightsList : list, anonymous = False) -> Expr:
+    """
+    For each weighed attribute, adds AAEM (companies by days) variables bounded from below by the absolute difference
+    between the attribute sum in the company and its ideal (DIM).  Days of zero weight are left out.
+    
+    Returns the weighed sum of AAEM to be added to the cost.
+    """
+    companyCount = MM.shape[0]
+    membership = MM.flatten()
 
+    AAEsum = Expr()
     for i, DAM in enumerate(DAM_list):
-        # for each attribute, calculate AEM = attribute error matrix.  
-        # AEM is a 4 by 14 matrix where each cell is that company's error from the ideal (=DIM) on that day for that attribute.
+        # for each attribute, AEM = attribute error matrix is a companyCount by dayCount matrix where each cell is that 
+        # company's error from the ideal (=DIM) on that day for that attribute.
         # Since the first attribute is always the "human" attribute, the first AAEM effectively shows errors in manpower.
-
         if weightsList[i] is None:
             continue
 
-        AEM = ASM_list[i] - np.tile(DIM[i, :], (4,1))
+        weights = np.asarray(weightsList[i], dtype=float)
+        days = np.flatnonzero(weights)
+        ASM = companyAttributeSums(DAM, companyCount, days)
+        ideal = np.tile(DIM[i, days], companyCount)
 
-        #AAEM = model.addMVar(shape = (4,14), name = f"absolute_error_{attributeList[i]}")
-        
-        # introduce absolute attribute error matrix variable
-        AAEM = np.empty((4,14), dtype=pyscipopt.Variable)
-        for compI in range(4):
-            for day in range(14):
-                AAEM[compI, day] = model.addVar(name = f"abs_err_{attributeList[i]}_{compI}_{day}")
-                # enforce absolute value via constraints
-                model.addCons(    AEM[compI, day] <= AAEM[compI, day])
-                model.addCons(-1* AEM[compI, day] <= AAEM[compI, day])
+        # introduce absolute attribute error matrix variable, enforce absolute value via constraints
+        AAEM = addVariables(model, (companyCount, len(days)), f"abs_err_{i}", anonymous = anonymous).flatten()
+        identity = sp.identity(len(AAEM))
+        variables = np.concatenate([membership, AAEM])
+        addLinearRows(model, sp.hstack([ASM, -identity]), variables, rhs = ideal, name = f"AAE_{i}_pos", anonymous = anonymous)
+        addLinearRows(model, sp.hstack([-ASM, -identity]), variables, rhs = -ideal, name = f"AAE_{i}_neg", anonymous = anonymous)
 
-        addendum = np.ones((1,4)) @ AAEM @ weightsList[i]
-        AAEsum += addendum[0]
+        AAEsum += linearExpr(np.tile(weights[days], companyCount), AAEM)
 
-    softPenaltySum = 0
+    return AAEsum
 
-    #  ATTRIBUTE LIMITS
-    for limitTuple in attributeLimits:
-        print(limitTuple)
-        attrId = limitTuple[0]
-        min = limitTuple[1]
-        max = limitTuple[2]
-        enableVector = limitTuple[3]
 
-        softWeight = None       
-        if len(limitTuple) > 4:
-            softWeight = limitTuple[4]
+def addAttributeLimitConstraints(model : Model, MM : np.ndarray, DAM_list : List[np.array], attributeLimits : list, anonymous = False) -> Expr:
+    """
+    Adds limits of attribute sums in companies on enabled days, see Problem.addAttributeLimits().
+    Hard limits become one ranged row per company and day.  Soft limits get a slack variable for each bound.
+
+    Returns the sum of penalties of soft limits to be added to the cost.
+    """
+    companyCount = MM.shape[0]
+    membership = MM.flatten()
+
+    softPenaltySum = Expr()
+    for l, limitTuple in enumerate(attributeLimits):
+        log.debug(f"Attribute limit {limitTuple}")
+        attrId, min, max, enableVector = limitTuple[:4]
+        softWeight = limitTuple[4] if len(limitTuple) > 4 else None
+
+        days = np.flatnonzero(enableVector)
+        ASM = companyAttributeSums(DAM_list[attrId], companyCount, days)
 
-        ASM = ASM_list[attrId]
+        if softWeight is None:
+            #add hard constraints
+            if np.isfinite(min) or np.isfinite(max):
+                addLinearRows(model, ASM, membership, lhs = min, rhs = max, name = f"Limit_{l}", anonymous = anonymous)
+            continue
 
-        for day in range(len(enableVector)):
-            if not enableVector[day]:
+        #add soft constraints
+        for bound, sign, side in [(min, 1, "min"), (max, -1, "max")]:
+            if not np.isfinite(bound):
                 continue
-            for compId in range(4):
-                compSum = ASM[compId, day]
-                if softWeight is None:
-                    #add hard constraints
-                    model.addCons(compSum >= min)
-                    model.addCons(compSum <= max)
-                else:
-                    #add soft constraints
-                    s1 = model.addVar(name = f"Slack", vtype = 'C')
-                    s2 = model.addVar(name = f"Slack", vtype = 'C')
+            slack = addVariables(model, ASM.shape[0], f"Slack_{l}_{side}", anonymous = anonymous)
+            A = sp.hstack([sign * ASM, sp.identity(len(slack))])
+            addLinearRows(model, A, np.concatenate([membership, slack]), lhs = sign * bound, name = f"Limit_{l}_{side}", anonymous = anonymous)
+            softPenaltySum += linearExpr(np.full(len(slack), softWeight), slack)
+
+    return softPenaltySum
+
+
+def canonicalCompanyVector(problem : Problem, companies : np.array, units : Units = None) -> np.array:
+    """
+    Relabels companies nobody is fixed to, so that free persons (anchor units, if @units are given) open them in order
+    (see addCompanySymmetryBreaking()).  The result is an equivalent assignment which satisfies the symmetry breaking constraints.
+    """
+    companyFixList = problem.companyFixList
+    usedCompanies = set(c for c in companyFixList if c is not None)
+    freeCompanies = [c for c in range(problem.companyCount) if c not in usedCompanies]
+    if units is None:
+        anchors = [j for j, fix in enumerate(companyFixList) if fix is None]
+    else:
+        anchors = units.anchorPersons()
+
+    mapping = {}
+    for j in anchors:
+        c = companies[j]
+        if c in freeCompanies and c not in mapping:
+            mapping[c] = freeCompanies[len(mapping)]
+    for c in freeCompanies:
+        if c not in mapping:
+            mapping[c] = freeCompanies[len(mapping)]
+
+    return np.array([mapping.get(c, c) for c in companies], dtype=int)
+
+
+def addCompanySymmetryBreaking(model : Model, MM : np.ndarray, units : Units) -> int:
+    """
+    Companies that nobody is fixed to (via Problem.fixCompanyForPerson or fixPeopleFromOldAssignment) are interchangeable:
+    relabeling them yields an equivalent solution.  Every solution can be relabeled so that these free companies are
+    opened in order of their first appearance among free persons.  Hence the k-th free person (counting from 0) may only 
+    be placed in a fixed-to company or in one of the first k+1 free companies, which is enforced by fixing the rest of
+    its membership variables to 0.
+    Only units of a single person anchor the order (see Units.anchors()); classes of interchangeable persons may be
+    spread over several companies and are simply relabeled along.
+
+    Only valid as long as companies differ by nothing but the fixings, which holds for all constraints of Problem.
+    Returns the number of membership variables fixed to 0.
+    """
+    usedCompanies = set(c for c in units.companyFixList if c is not None)
+    freeCompanies = [c for c in range(MM.shape[0]) if c not in usedCompanies]
+    freePeople = units.anchors()
 
-                    model.addCons(compSum + s1 >= min)
-                    model.addCons(compSum - s2 <= max)
+    fixedCount = 0
+    for k, j in enumerate(freePeople[:len(freeCompanies) - 1]):
+        for c in freeCompanies[k+1:]:
+            model.chgVarUb(MM[c, j], 0)
+            fixedCount += 1
 
-                    softPenaltySum += (s1 + s2) * softWeight
+    return fixedCount
 
 
+def sharedCompanyExpr(MM : np.ndarray, i : int, j : int):
+    """
+    Expression equal to 1 if persons i and j share a company, 0 otherwise.
+    Just a fancy name for the product of columns of MM.
+    """
+    ex = np.ones((1,MM.shape[0])) @ (MM[:, i] * MM[:, j])
+    return ex[0]
 
-    #  SHARED COMPANY MATRIX
-    #       used for tracking whether two persons are assigned to the same company this year.
-    #       just a fancy name for prepared products of columns of MM
-    SCM = np.empty((personCount,personCount), dtype=pyscipopt.Expr)
 
-    for i in range(personCount):
-        for j in range(i, personCount):
-            ex = np.ones((1,4)) @ (MM[:, i] * MM[:, j])
-            ex = ex[0]
-            SCM[i,j] = ex
-            SCM[j,i] = ex
+def addQuadraticCoCompanyPenalties(model : Model, MM : np.ndarray, pairIndex : PairIndex):
+    """
+    Quadratic formulation of co-company penalties.
+    Whether two persons share a company is expressed directly as the sum of products of their MM columns.
 
+    Returns CCPsum expression to be added to the cost.
+    """
     #sum of penalties for sharing companies with people they have shared companies with previously
-    CCPsum = 0
-    for i in range(personCount):
-        for j in range(i, personCount):     #take just lower triangle to avoid doubling
-            if CCPM[i,j] != 0:
-                penalty = CCPM[i,j] * np.sum(personList[i].presence * personList[j].presence)
-                addendum = SCM[i,j] * penalty
-                CCPsum += addendum
+    CCPsum = pairIndex.selfPenalty
+    for i, j, penalty in zip(pairIndex.rows(), pairIndex.indices, pairIndex.penalty):
+        CCPsum += sharedCompanyExpr(MM, i, j) * penalty
 
+    return CCPsum
 
-    #keep together / keep apart constraints 
-    for coupling in personalCouplingList:
 
-        p1 : Person = coupling[0]
-        p2 : Person = coupling[1]
-        desiredProduct = coupling[2]
+def addQuadraticCouplings(model : Model, MM : np.ndarray, pairIndex : PairIndex):
+    """
+    Quadratic formulation of keep together / keep apart constraints, see addQuadraticCoCompanyPenalties().
 
-        softWeight = None
-        if len(coupling) > 3:
-            softWeight = coupling[3]
+    Returns couplingPenaltySum expression (penalties of soft couplings) to be added to the cost.
+    """
+    couplingPenaltySum = 0
+    for i, j, desiredProduct, softWeight in pairIndex.couplings:
 
         #get variable representing those people sharing a company
-        product = SCM[personDict[p1.name], personDict[p2.name]]
+        product = sharedCompanyExpr(MM, i, j)
 
         if softWeight is None:
             model.addCons(product == desiredProduct)
@@ -174,48 +472,102 @@ def optimize(problem : Problem, oldAssignment : Assignment = None, maxtime = Non
             elif desiredProduct == 0:
                 model.addCons(product - s == desiredProduct)
 
-            softPenaltySum += s * softWeight
-
-
-    # -------------------------------------------
-
-    cost = AAEsum + CCPsum + softPenaltySum
-
-    objVar = model.addVar(name = "objectiveVariable")
-    model.addCons(objVar >= cost)
-
-    model.setObjective(objVar)
+            couplingPenaltySum += s * softWeight
 
-    if not (maxtime is None):
-        model.setParam('limits/time', maxtime)
-
-    model.optimize()
-
-    status = model.getStatus()
-    if status in ["userinterrupt", "timelimit"]:
-        pass
-    elif status != "optimal":
-        print(f"Could not find assignment. {status}")
-        return None
-
-    MM_val = np.empty((4, personCount), dtype=int)
-    for i in range(4):
-        for j in range(personCount):
-            MM_val[i,j] = round(model.getVal(MM[i,j]))
+    return couplingPenaltySum
 
-    print("MM_val:")
-    print(MM_val)
 
-    SCM_val = np.zeros((personCount,personCount), dtype=int)
-    for i in range(personCount):
-        for j in range(personCount):
-            SCM_val[i,j] = round(model.getVal(SCM[i,j]))
+def addLinearCoCompanyPenalties(model : Model, MM : np.ndarray, pairIndex : PairIndex, anonymous = False) -> Expr:
+    """
+    Linear formulation of co-company penalties.
 
-    result = Assignment(personList, MM_val, SCM_val)
+    For a pair with positive penalty, a single continuous variable SC (shared company) is bounded from below by 
+    MM[c,i] + MM[c,j] - 1 for every company c.  Since SC is minimized, it equals 1 exactly when the pair shares a company.
+    Negative penalties (rewards) need an upper bound as well, so they get one auxiliary variable per company, 
+    bounded by both MM[c,i] and MM[c,j].
 
+    Returns CCPsum expression to be added to the cost.
+    """
+    companyCount, personCount = MM.shape
+    membership = MM.flatten()
+    rows = pairIndex.rows()
+    cols = pairIndex.indices
+    penalty = pairIndex.penalty
+    companies = np.arange(companyCount)
 
-    return result
+    #sum of penalties for sharing companies with people they have shared companies with previously
+    CCPsum = linearExpr([], [], pairIndex.selfPenalty)
+
+    positive = np.flatnonzero(penalty > 0)
+    if len(positive):
+        i, j = rows[positive], cols[positive]
+        SC = addVariables(model, len(positive), "SC", ub = 1, anonymous = anonymous)
+        #row p*companyCount + c:  SC[p] - MM[c,i] - MM[c,j] >= -1
+        pairs = np.repeat(np.arange(len(positive)), companyCount)
+        c = np.tile(companies, len(positive))
+        r = np.arange(len(pairs))
+        A = sp.csr_matrix((np.concatenate([np.ones(len(r)), -np.ones(2*len(r))]),
+                           (np.tile(r, 3), np.concatenate([personCount*companyCount + pairs, c*personCount + i[pairs], c*personCount + j[pairs]]))),
+                          shape = (len(r), len(membership) + len(SC)))
+        addLinearRows(model, A, np.concatenate([membership, SC]), lhs = -1, name = "SC", anonymous = anonymous)
+        CCPsum += linearExpr(penalty[positive], SC)
+
+    negative = np.flatnonzero(penalty < 0)
+    if len(negative):
+        i, j = rows[negative], cols[negative]
+        SC = addVariables(model, (len(negative), companyCount), "SC_neg", ub = 1, anonymous = anonymous).flatten()
+        #rows 2*(p*companyCount + c) + {0, 1}:  SC[p,c] - MM[c,i] <= 0  and  SC[p,c] - MM[c,j] <= 0
+        pairs = np.repeat(np.arange(len(negative)), companyCount)
+        c = np.tile(companies, len(negative))
+        k = np.arange(len(SC))
+        A = sp.csr_matrix((np.concatenate([np.ones(2*len(k)), -np.ones(2*len(k))]),
+                           (np.concatenate([2*k, 2*k + 1, 2*k, 2*k + 1]),
+                            np.concatenate([len(membership) + k, len(membership) + k, c*personCount + i[pairs], c*personCount + j[pairs]]))),
+                          shape = (2*len(k), len(membership) + len(SC)))
+        addLinearRows(model, A, np.concatenate([membership, SC]), rhs = 0, name = "SC_neg", anonymous = anonymous)
+        CCPsum += linearExpr(np.repeat(penalty[negative], companyCount), SC)
+
+    return CCPsum
+
+
+def addLinearCouplings(model : Model, MM : np.ndarray, pairIndex : PairIndex, anonymous = False) -> Expr:
+    """
+    Linear formulation of keep together / keep apart constraints.
+    Hard couplings become plain linear (in)equalities between columns of MM, soft ones get a binary slack bounded
+    like the shared company variables of addLinearCoCompanyPenalties().
 
+    Returns couplingPenaltySum expression (penalties of soft couplings) to be added to the cost.
+    """
+    companyCount, personCount = MM.shape
+    membership = MM.flatten()
+    couplings = pairIndex.couplings
+    soft = [k for k, coupling in enumerate(couplings) if coupling[3] is not None]
+    slack = addVariables(model, len(soft), "Slack_coupling", vtype = 'B', anonymous = anonymous)
+    slackOf = {k : len(membership) + s for s, k in enumerate(soft)}
+
+    #one row per coupling and company, coefficients of MM[c,i], MM[c,j] and slack
+    #   hard together:  MM[c,i] - MM[c,j] == 0          hard apart:  MM[c,i] + MM[c,j] <= 1
+    #   soft together:  MM[c,i] - MM[c,j] - s <= 0      soft apart:  MM[c,i] + MM[c,j] - s <= 1
+    rowIds, colIds, values, lhs, rhs = [], [], [], [], []
+    for k, (i, j, desiredProduct, softWeight) in enumerate(couplings):
+        together = desiredProduct == 1
+        for c in range(companyCount):
+            r = len(lhs)
+            rowIds += [r, r]
+            colIds += [c*personCount + i, c*personCount + j]
+            values += [1, -1 if together else 1]
+            if softWeight is not None:
+                rowIds.append(r)
+                colIds.append(slackOf[k])
+                values.append(-1)
+            lhs.append(0 if together and softWeight is None else -np.inf)
+            rhs.append(0 if together else 1)
+
+    if lhs:
+        A = sp.csr_matrix((values, (rowIds, colIds)), shape = (len(lhs), len(membership) + len(slack)))
+        addLinearRows(model, A, np.concatenate([membership, slack]), lhs = lhs, rhs = rhs, name = "Coupling", anonymous = anonymous)
+
+    return linearExpr([couplings[k][3] for k in soft], slack)
 
         
 
@@ -0,0 +1,190 @@
+
+from pyscipopt import Eventhdlr, SCIP_EVENTTYPE, SCIP_PARAMEMPHASIS
+
+from .dataObjects import *
+from .matrixUtils import *
+from .optimize import optimize
+from .localSearch import localSearch
+from .evaluate import evaluateAssignment
+from .progress import solutionCompanies
+
+import numpy as np
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import List
+
+
+DEFAULT_PORTFOLIO = [
+    {"seed" : 0},
+    {"seed" : 1, "emphasis" : "feasibility"},
+    {"seed" : 2, "emphasis" : "optimality"},
+    {"kind" : "localsearch", "seed" : 3},
+    {"seed" : 4, "symmetryBreaking" : "scip"},
+    {"seed" : 5, "emphasis" : "feasibility", "formulation" : "quadratic"},
+    {"seed" : 6, "emphasis" : "easycip"},
+    {"kind" : "localsearch", "seed" : 7, "swapProbability" : 0.6},
+]
+
+
+class PortfolioEventhdlr(Eventhdlr):
+    """
+    Shares incumbents and dual bounds of one SCIP worker with the rest of the portfolio.
+    Every new best solution is published (if better than the shared one).  Periodically, a shared incumbent better than
+    this worker's own is applied as objective limit, so that the worker only searches for strictly better solutions.
+    The solve stops early when another worker proved optimality, or when the shared incumbent is within this worker's dual bound.
+    """
+
+    def __init__(self, MM, shared, lock, workerName, checkInterval = 0.5):
+        self.MM = MM
+        self.shared = shared
+        self.lock = lock
+        self.workerName = workerName
+        self.checkInterval = checkInterval
+        self.lastCheck = 0
+        self.cutoff = None
+
+    def eventinit(self):
+        self.model.catchEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+        self.model.catchEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+        self.model.catchEvent(SCIP_EVENTTYPE.LPSOLVED, self)     #root node of a big model can take long, check between its LPs too
+
+    def eventexit(self):
+        self.model.dropEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+        self.model.dropEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+        self.model.dropEvent(SCIP_EVENTTYPE.LPSOLVED, self)
+
+    def eventexec(self, event):
+        if event.getType() == SCIP_EVENTTYPE.BESTSOLFOUND:
+            sol = self.model.getBestSol()
+            cost = self.model.getSolObjVal(sol)
+            if cost < self.shared["bestCost"]:
+                companies = solutionCompanies(self.model, self.MM, sol).tolist()
+                publishIncumbent(self.shared, self.lock, cost, companies, self.workerName)
+            return
+
+        now = time.perf_counter()
+        if now - self.lastCheck < self.checkInterval:
+            return
+        self.lastCheck = now
+
+        if self.shared["done"]:
+            self.model.interruptSolve()
+            return
+        bestCost = self.shared["bestCost"]
+        if bestCost <= self.model.getDualbound() + 1e-6:
+            #shared incumbent cannot be improved upon according to this worker's bound -> it is optimal
+            self.shared["done"] = True
+            self.model.interruptSolve()
+            return
+        #not from BESTSOLFOUND: tightening the limit while a solution is being added is an error in SCIP
+        if bestCost < self.model.getPrimalbound() - 1e-6 and bestCost < self.model.getObjlimit():
+            self.model.setObjlimit(bestCost)
+            self.cutoff = bestCost
+
+
+def publishIncumbent(shared, lock, cost, companies, workerName):
+    with lock:
+        if cost < shared["bestCost"]:
+            shared["bestCost"] = cost
+            shared["bestCompanies"] = companies
+            shared["bestWorker"] = workerName
+
+
+def portfolioWorker(problem : Problem, config : dict, deadline, shared, lock, quiet = True):
+    """
+    Runs one member of the portfolio until @deadline (time.time() of the end of the whole portfolio).  A worker starting
+    after others (more configs than processes) is warm started from the shared incumbent.
+    Returns (workerName, company vector or None, cost, status)
+    """
+    config = dict(config)
+    kind = config.pop("kind", "scip")
+    seed = config.pop("seed", 0)
+    workerName = "-".join([kind, f"{seed}"] + [f"{v}" for v in config.values()])
+
+    maxtime = deadline - time.time()
+    if shared["done"] or maxtime <= 0:
+        return workerName, None, np.inf, "skipped"
+    initial = None
+    if shared["bestCompanies"] is not None:
+        initial = companyVectorToAssignment(problem.personList, shared["bestCompanies"], problem.companyCount)
+
+    if kind == "localsearch":
+        assignment = localSearch(problem, maxtime = maxtime, seed = seed, initial = initial, shouldStop = lambda: shared["done"], **config)
+        status = "stopped"
+    else:
+        emphasis = config.pop("emphasis", None)
+        solved = {}
+
+        def hook(model, MM):
+            solved["model"] = model
+            if quiet:
+                model.hideOutput()
+            model.setParam('randomization/randomseedshift', seed)
+            model.setParam('randomization/permutationseed', seed)
+            if emphasis is not None:
+                model.setEmphasis(getattr(SCIP_PARAMEMPHASIS, emphasis.upper()))
+            solved["handler"] = PortfolioEventhdlr(MM, shared, lock, workerName)
+            model.includeEventhdlr(solved["handler"], "portfolio", "shares incumbents between workers")
+
+        assignment = optimize(problem, oldAssignment = initial, maxtime = maxtime, modelHook = hook, **config)
+        status = solved["model"].getStatus() if "model" in solved else None
+        if status == "optimal":
+            shared["done"] = True
+        if assignment is None and "handler" in solved and solved["handler"].cutoff is not None:
+            #nothing better than the shared incumbent exists within this worker's search
+            status = "cutoff"
+
+    if assignment is None:
+        return workerName, None, np.inf, status
+
+    companies = [assignment.getCompanyByName(p.name) for p in problem.personList]
+    evaluation = evaluateAssignment(problem, companies)
+    if not evaluation.isFeasible():
+        #local search only penalizes hard constraints, such a result must not become the shared incumbent
+        return workerName, None, np.inf, "violates hard constraints"
+    publishIncumbent(shared, lock, evaluation.total, companies, workerName)
+    return workerName, companies, evaluation.total, status
+
+
+def optimizePortfolio(problem : Problem, maxtime = 60, configs : List[dict] = None, workers : int = None, quiet = True) -> Assignment:
+    """
+    Solves @problem by a portfolio of differently configured solvers running in parallel processes.
+    Returns the best Assignment found when the time limit hits or when one of the workers proves optimality.
+    Workers share their incumbents: each SCIP worker uses the best cost found by anyone as its objective limit.
+
+    Params:
+    ---------
+    maxtime : wall clock time limit of the whole portfolio (seconds).  If there are more configs than workers, the
+        queued ones only get the time left when they start.
+    configs : list of dicts, one per worker.  Keys: "kind" ("scip" or "localsearch"), "seed", "emphasis" (name of
+        SCIP_PARAMEMPHASIS, e.g. "feasibility"), plus any keyword arguments of optimize() (e.g. "formulation") or
+        localSearch() respectively.  Defaults to DEFAULT_PORTFOLIO trimmed to number of workers.
+    workers : number of processes, defaults to the number of CPUs
+    quiet : if True, SCIP output of workers is hidden
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if configs is None:
+        configs = DEFAULT_PORTFOLIO[:max(workers, 1)]
+    deadline = time.time() + maxtime
+
+    with multiprocessing.Manager() as manager:
+        shared = manager.dict(bestCost = np.inf, bestCompanies = None, bestWorker = None, done = False)
+        lock = manager.Lock()
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = [executor.submit(portfolioWorker, problem, config, deadline, shared, lock, quiet) for config in configs]
+            for future in futures:
+                workerName, companies, cost, status = future.result()
+                print(f"Portfolio worker {workerName}: cost {cost:.2f} ({status})")
+
+        bestCompanies = shared["bestCompanies"]
+        print(f"Portfolio best: {shared['bestCost']:.2f} by {shared['bestWorker']}")
+
+    if bestCompanies is None:
+        print("Portfolio did not find any assignment.")
+        return None
+    return companyVectorToAssignment(problem.personList, bestCompanies, problem.companyCount)
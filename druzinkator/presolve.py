@@ -0,0 +1,185 @@
+
+from .dataObjects import *
+
+import numpy as np
+import logging as log
+
+from typing import List
+
+
+def keptTogetherGroups(problem : Problem) -> np.array:
+    """
+    Unions persons joined by hard keepTogether couplings (including transitive chains) into groups.
+    Returns group index of each person, groups numbered in order of their first member.
+    """
+    personCount = len(problem.personList)
+    parent = np.arange(personCount)
+
+    def root(j):
+        while parent[j] != j:
+            parent[j] = parent[parent[j]]
+            j = parent[j]
+        return j
+
+    for coupling in problem.personalCouplingList:
+        if len(coupling) == 3 and coupling[2] == 1:
+            i, j = root(problem.personDict[coupling[0].name]), root(problem.personDict[coupling[1].name])
+            parent[max(i, j)] = min(i, j)
+
+    roots = np.array([root(j) for j in range(personCount)], dtype=int)
+    return np.unique(roots, return_inverse = True)[1]
+
+
+class Units:
+    """
+    Decision units of optimize(), one column of the membership matrix MM each.
+
+    First, persons joined by hard keepTogether couplings are contracted into nodes that are placed as a whole, with
+    summed presence and attributes.  Their fixings are merged and contradictions (keep apart within a node, different
+    fixings) are reported by an Exception before anything is modelled.
+
+    Then nodes that are interchangeable (same daily attributes, no co-company penalties, no couplings and no fixing)
+    are aggregated into classes.  A class is modelled by one integer variable per company counting how many of its
+    nodes are placed there, instead of a binary per node and company.  Every other node is a unit on its own.
+
+    Attributes:
+    ---------
+    personCount, nodeCount, unitCount
+    nodes : list of np.arrays.  Person indices of each node, in ascending order
+    nodeOf, unitOf : np.array.  Node and unit index of each person
+    members : list of np.arrays.  Node indices of each unit, in ascending order
+    sizes : np.array.  Number of nodes of each unit, i.e. upper bound of its MM entries
+    companyFixList : company each unit is fixed to, or None
+    DAT : units by attributes by days.  Summed attributes of one node of each unit (all nodes of a unit are alike)
+    pairIndex : PairIndex over units, see PairIndex.contract()
+    """
+
+    def __init__(self, problem : Problem, aggregate = True, contract = True) -> None:
+        personList = problem.personList
+        personCount = len(personList)
+        DAT = problem.getDerivedData().DAT
+        pairIndex = problem.getPairIndex()
+
+        #   NODES
+        nodeOf = keptTogetherGroups(problem) if contract else np.arange(personCount)
+        nodeCount = nodeOf.max(initial = -1) + 1
+        nodes = [[] for n in range(nodeCount)]
+        for j, n in enumerate(nodeOf):
+            nodes[n].append(j)
+        self.checkNodes(problem, nodes, nodeOf)
+
+        nodeDAT = np.zeros((nodeCount,) + DAT.shape[1:])
+        np.add.at(nodeDAT, nodeOf, DAT)
+        nodeFixList = [next((problem.companyFixList[j] for j in node if problem.companyFixList[j] is not None), None) for node in nodes]
+        nodePairIndex = pairIndex.contract(nodeOf, nodeCount)
+
+        #   UNITS
+        #nodes that interact with anyone else or are fixed cannot be interchanged
+        eligible = np.ones(nodeCount, dtype=bool)
+        eligible[nodePairIndex.rows()] = False
+        eligible[nodePairIndex.indices] = False
+        for i, j, *_ in nodePairIndex.couplings:
+            eligible[[i, j]] = False
+        eligible &= np.array([fix is None for fix in nodeFixList], dtype=bool)
+        if not aggregate:
+            eligible[:] = False
+
+        #units are numbered in order of their first node
+        unitOfNode = np.empty(nodeCount, dtype=int)
+        classes = {}
+        members = []
+        for n in range(nodeCount):
+            key = nodeDAT[n].tobytes() if eligible[n] else None
+            if key is not None and key in classes:
+                unit = classes[key]
+                members[unit].append(n)
+            else:
+                unit = len(members)
+                members.append([n])
+                if key is not None:
+                    classes[key] = unit
+            unitOfNode[n] = unit
+
+        self.personCount = personCount
+        self.nodeCount = nodeCount
+        self.unitCount = len(members)
+        self.nodes = [np.array(node, dtype=int) for node in nodes]
+        self.nodeOf = nodeOf
+        self.unitOf = unitOfNode[nodeOf]
+        self.members = [np.array(m, dtype=int) for m in members]
+        self.sizes = np.array([len(m) for m in members], dtype=int)
+        first = np.array([m[0] for m in members], dtype=int)
+        self.companyFixList = [nodeFixList[n] for n in first]
+        self.DAT = nodeDAT[first]
+        self.pairIndex = nodePairIndex.contract(unitOfNode, self.unitCount)
+
+        log.info(f"{personCount} persons contracted into {nodeCount} nodes, modelled as {self.unitCount} units "
+                 f"({np.count_nonzero(self.sizes > 1)} classes of interchangeable nodes)")
+
+    @staticmethod
+    def checkNodes(problem : Problem, nodes : List[List[int]], nodeOf : np.array):
+        """
+        Raises an Exception if persons that must be kept together are also to be kept apart, or are fixed to different companies.
+        """
+        personList = problem.personList
+        groupNames = lambda n: ", ".join(personList[j].name for j in nodes[n])
+
+        for coupling in problem.personalCouplingList:
+            if len(coupling) == 3 and coupling[2] == 0:
+                i, j = problem.personDict[coupling[0].name], problem.personDict[coupling[1].name]
+                if nodeOf[i] == nodeOf[j]:
+                    raise Exception(f"{personList[i].name} and {personList[j].name} must be kept apart, but are kept together "
+                                    f"(directly or through a chain) in group {groupNames(nodeOf[i])}.")
+
+        for n, node in enumerate(nodes):
+            fixes = set(problem.companyFixList[j] for j in node if problem.companyFixList[j] is not None)
+            if len(fixes) > 1:
+                raise Exception(f"Persons kept together in group {groupNames(n)} are fixed to different companies {sorted(fixes)}.")
+
+    def DAM_list(self) -> List[np.array]:
+        """
+        Daily attribute matrices (units by days) of each attribute.
+        """
+        return [self.DAT[:, i, :] for i in range(self.DAT.shape[1])]
+
+    def anchors(self) -> List[int]:
+        """
+        Units that may anchor company symmetry breaking: units of a single node with no fixing.
+        """
+        return [u for u in range(self.unitCount) if self.sizes[u] == 1 and self.companyFixList[u] is None]
+
+    def anchorPersons(self) -> List[int]:
+        """
+        First person of each anchor unit, see anchors().
+        """
+        return [self.nodes[self.members[u][0]][0] for u in self.anchors()]
+
+    def counts(self, companies : np.array, companyCount : int) -> np.array:
+        """
+        Returns companyCount by unitCount matrix of MM values for a vector holding company of each person.
+        Each node is counted in the company of its first person.
+        """
+        companies = np.asarray(companies, dtype=int)
+        firstPersons = np.array([node[0] for node in self.nodes], dtype=int)
+        counts = np.zeros((companyCount, self.unitCount), dtype=int)
+        np.add.at(counts, (companies[firstPersons], self.unitOf[firstPersons]), 1)
+        return counts
+
+    def expand(self, counts : np.array) -> np.array:
+        """
+        Returns company of each person for a companies by units matrix of MM values.  Nodes of a class fill
+        companies in ascending order of both (first counts[0,u] nodes go to company 0 and so on), so the result is
+        deterministic.  All persons of a node share its company.
+        """
+        counts = np.rint(np.asarray(counts)).astype(int)
+        companies = np.empty(self.personCount, dtype=int)
+        for u, members in enumerate(self.members):
+            if len(members) == 1:
+                nodeCompanies = [np.argmax(counts[:, u])]
+            else:
+                nodeCompanies = np.repeat(np.arange(counts.shape[0]), np.maximum(counts[:, u], 0))
+                if len(nodeCompanies) != len(members):
+                    raise Exception(f"Counts of unit {u} add up to {len(nodeCompanies)} instead of {len(members)} nodes")
+            for n, company in zip(members, nodeCompanies):
+                companies[self.nodes[n]] = company
+        return companies
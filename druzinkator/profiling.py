@@ -0,0 +1,155 @@
+
+import json
+import time
+
+from pyscipopt import Model, SCIP_STAGE
+
+from typing import List
+
+
+def residentMemory() -> float:
+    """
+    Returns resident memory of this process in MB, or None where it cannot be read (only Linux /proc is supported).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    import resource
+    return pages * resource.getpagesize() / 2**20
+
+
+class PhaseProfiler:
+    """
+    Records wall time, memory and growth of the SCIP model over named phases of optimize().
+    Use as profiler("name") in a with statement.  Each phase is stored as a dict with keys:
+
+    name, time : wall time (seconds)
+    memory : change of resident memory of the process (MB), None if unknown
+    scipMemory : memory used by SCIP at the end of the phase (MB)
+    variables, constraints : number of variables and constraints added during the phase, None for phases that
+        transform the model or come after (solve, extraction)
+    nonzeros : number of variables in constraints added during the phase, filled in by countNonzeros()
+    """
+
+    def __init__(self, model : Model) -> None:
+        self.model = model
+        self.phases = []
+        self.current = None
+
+    def __call__(self, name : str):
+        self.current = {"name" : name}
+        return self
+
+    def __enter__(self):
+        phase = self.current
+        phase["start"] = time.perf_counter()
+        phase["startMemory"] = residentMemory()
+        phase["building"] = self.model.getStage() == SCIP_STAGE.PROBLEM
+        phase["startVars"] = self.model.getNVars()
+        phase["startConss"] = self.model.getNConss()
+        return self
+
+    def __exit__(self, *args):
+        phase = self.current
+        endMemory = residentMemory()
+        building = phase["building"] and self.model.getStage() == SCIP_STAGE.PROBLEM
+        self.phases.append({
+            "name" : phase["name"],
+            "time" : time.perf_counter() - phase["start"],
+            "memory" : None if endMemory is None or phase["startMemory"] is None else endMemory - phase["startMemory"],
+            "scipMemory" : self.model.getMemUsed() / 2**20,
+            "variables" : self.model.getNVars() - phase["startVars"] if building else None,
+            "constraints" : self.model.getNConss() - phase["startConss"] if building else None,
+            "nonzeros" : None,
+            "firstCons" : phase["startConss"],
+        })
+        self.current = None
+
+    def countNonzeros(self) -> int:
+        """
+        Counts nonzeros of the constraint matrix and attributes them to phases.  Must be called before solving,
+        while the model still holds only the original constraints in order of their creation.
+        """
+        counts = [self.model.getConsNVars(cons) for cons in self.model.getConss(transformed = False)]
+        for phase in self.phases:
+            if phase["constraints"] is None:
+                continue
+            first = phase["firstCons"]
+            phase["nonzeros"] = sum(counts[first : first + phase["constraints"]])
+        return sum(counts)
+
+
+class SolveStats:
+    """
+    Instrumentation of one run of optimize(): per-phase profile of model building, model size and solver outcome.
+
+    phases : list of dicts, see PhaseProfiler
+    variables, constraints, nonzeros : size of the original model
+    status, gap, primalBound, dualBound, nodes : as reported by SCIP at the end of the solve
+    solvingTime : time spent by SCIP in solving (seconds), totalTime : wall time of the whole optimize() call
+    """
+
+    def __init__(self, phases : List[dict] = None) -> None:
+        self.phases = phases if phases is not None else []
+        self.variables = None
+        self.constraints = None
+        self.nonzeros = None
+        self.status = None
+        self.gap = None
+        self.primalBound = None
+        self.dualBound = None
+        self.nodes = None
+        self.solvingTime = None
+        self.totalTime = None
+
+    def readSolver(self, model : Model):
+        self.status = model.getStatus()
+        self.gap = model.getGap()
+        self.primalBound = model.getPrimalbound()
+        self.dualBound = model.getDualbound()
+        self.nodes = model.getNTotalNodes()
+        self.solvingTime = model.getSolvingTime()
+
+    def phaseTime(self, name : str) -> float:
+        return sum(p["time"] for p in self.phases if p["name"] == name)
+
+    def buildTime(self) -> float:
+        """
+        Wall time of everything but solving and extraction, i.e. of constructing the model.
+        """
+        return sum(p["time"] for p in self.phases if p["name"] not in ["solve", "extraction"])
+
+    def toDict(self) -> dict:
+        d = dict(self.__dict__)
+        d["phases"] = [{k : v for k, v in p.items() if k != "firstCons"} for p in self.phases]
+        d["buildTime"] = self.buildTime()
+        return d
+
+    def saveJson(self, filename : str):
+        with open(filename, 'w') as file:
+            json.dump(self.toDict(), file, indent = 2)
+
+    def __str__(self) -> str:
+        s = f"===Solve stats: {self.status}, gap {self.gap}, primal {self.primalBound}, dual {self.dualBound}, {self.nodes} nodes===\n"
+        s += f"Model: {self.variables} variables, {self.constraints} constraints, {self.nonzeros} nonzeros\n"
+        for p in self.phases:
+            memory = "?" if p["memory"] is None else f"{p['memory']:+.1f}"
+            size = "" if p["constraints"] is None else f", +{p['variables']} vars, +{p['constraints']} conss, {p['nonzeros']} nz"
+            s += f"{p['name']:>16}: {p['time']:8.3f}s, {memory} MB{size}\n"
+        s += f"Build {self.buildTime():.3f}s, solve {self.phaseTime('solve'):.3f}s, total {self.totalTime:.3f}s\n"
+        return s
+
+
+class SolveResult:
+    """
+    Returned by optimize(..., returnStats = True).
+
+    assignment : the Assignment found, None if there is none
+    stats : SolveStats of the run
+    """
+
+    def __init__(self, assignment, stats : SolveStats) -> None:
+        self.assignment = assignment
+        self.stats = stats
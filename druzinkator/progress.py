@@ -0,0 +1,120 @@
+
+from pyscipopt import Eventhdlr, SCIP_EVENTTYPE
+
+from .dataObjects import *
+from .evaluate import evaluateAssignment
+
+import json
+import numpy as np
+import time
+
+from typing import List
+
+
+def solutionCompanies(model, MM : np.ndarray, sol = None, units = None) -> np.array:
+    """
+    Returns company index of each person in solution @sol of @model (the best one by default), read from membership matrix @MM.
+    @units are the Units of MM columns, by default taken from model.data as set by optimize().
+    """
+    if sol is None:
+        sol = model.getBestSol()
+    if units is None:
+        units = model.data
+    MM_val = np.array([[model.getSolVal(sol, MM[i,j]) for j in range(MM.shape[1])] for i in range(MM.shape[0])])
+    if units is None:
+        return MM_val.argmax(axis = 0)
+    return units.expand(MM_val)
+
+
+def costBreakdown(problem : Problem, companies : np.array) -> dict:
+    """
+    Terms of the objective for company vector @companies, see evaluateAssignment().
+    """
+    evaluation = evaluateAssignment(problem, companies)
+    return {
+        "total" : evaluation.total,
+        "attributeErrors" : evaluation.attributeErrors,
+        "coCompanyPenalty" : evaluation.coCompanyPenalty,
+        "softLimits" : sum(cost for *_, cost in evaluation.softLimits),
+        "softCouplings" : sum(cost for *_, cost in evaluation.softCouplings),
+    }
+
+
+class JsonlProgressWriter:
+    """
+    Progress callback writing each event as one line of JSON into @filename.  Lines are flushed immediately,
+    so the file can be followed while the solver runs.
+    """
+
+    def __init__(self, filename : str) -> None:
+        self.filename = filename
+        self.file = open(filename, 'w', encoding = "utf-8")
+
+    def __call__(self, event : dict):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ProgressEventhdlr(Eventhdlr):
+    """
+    Reports progress of a running solve to @callbacks (functions taking one dict).  Every event has keys
+    event, time (wall time since @startTime), solvingTime, nodes, primalBound, dualBound and gap.  Events:
+
+    "incumbent" : a new best solution was found.  Also has cost (breakdown by costBreakdown()) and companies
+        (company vector) of the solution.  Cost is evaluated from membership only, so it can be lower than the
+        objective (primalBound) of early heuristic solutions whose auxiliary variables are not tight
+    "bound" : dual bound changed.  Checked at most once per @interval seconds
+    "end" : the solve finished, also has status.  Sent by finish()
+    """
+
+    def __init__(self, problem : Problem, MM, callbacks : List, startTime : float = None, interval = 0.5, units = None):
+        self.problem = problem
+        self.MM = MM
+        self.units = units
+        self.callbacks = callbacks
+        self.startTime = time.perf_counter() if startTime is None else startTime
+        self.interval = interval
+        self.lastCheck = 0
+        self.lastDualBound = None
+
+    def eventinit(self):
+        self.model.catchEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+        self.model.catchEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+    def eventexit(self):
+        self.model.dropEvent(SCIP_EVENTTYPE.BESTSOLFOUND, self)
+        self.model.dropEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+    def emit(self, kind : str, **data):
+        model = self.model
+        event = {"event" : kind, "time" : time.perf_counter() - self.startTime, "solvingTime" : model.getSolvingTime(),
+                 "nodes" : model.getNNodes(), "primalBound" : model.getPrimalbound(), "dualBound" : model.getDualbound(),
+                 "gap" : model.getGap()}
+        event.update(data)
+        for callback in self.callbacks:
+            callback(event)
+
+    def eventexec(self, event):
+        if event.getType() == SCIP_EVENTTYPE.BESTSOLFOUND:
+            sol = self.model.getBestSol()
+            companies = solutionCompanies(self.model, self.MM, sol, self.units)
+            #primal bound is only updated after the event, report objective of the new solution instead
+            self.emit("incumbent", primalBound = self.model.getSolObjVal(sol), cost = costBreakdown(self.problem, companies),
+                      companies = companies.tolist())
+            return
+
+        now = time.perf_counter()
+        if now - self.lastCheck < self.interval:
+            return
+        self.lastCheck = now
+
+        dualBound = self.model.getDualbound()
+        if dualBound != self.lastDualBound:
+            self.lastDualBound = dualBound
+            self.emit("bound")
+
+    def finish(self):
+        self.emit("end", status = self.model.getStatus())
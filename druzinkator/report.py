@@ -0,0 +1,127 @@
+
+import base64
+import html
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .dataObjects import *
+from .evaluate import evaluateAssignment
+from .visualize import figureList, figureName, plotFigure
+
+from typing import List
+
+
+REPORT_LINES_PER_PAGE = 70
+
+#problem and assignment of the report being rendered, set once per worker process by initReportWorker()
+reportData = {}
+
+
+def initReportWorker(problem : Problem, assignment : Assignment, attributeList, dpi):
+    reportData["problem"] = problem
+    reportData["assignment"] = assignment
+    reportData["attributeList"] = attributeList
+    reportData["dpi"] = dpi
+
+
+def renderReportFigure(figure : tuple, outFile : str) -> str:
+    """
+    Renders one figure of figureList() into @outFile in a worker process.  Headless, pyplot is never imported.
+    """
+    import matplotlib
+    with matplotlib.rc_context({"savefig.dpi" : reportData["dpi"]}):
+        plotFigure(figure, reportData["assignment"], reportData["problem"], outFile, reportData["attributeList"])
+    return outFile
+
+
+def renderReport(problem : Problem, assignment : Assignment, filename : str, workers : int = None, attributeList = None,
+                 plotEveryone = True, dpi = 150) -> str:
+    """
+    Renders a report of @assignment into a single file, without showing anything or waiting for input:
+    evaluation summary, attribute balance, CCPM of everyone and of each company and presence of each company.
+    Figures are rendered in parallel in a pool of @workers processes (number of CPUs by default).
+
+    Params:
+    ---------
+    filename : .pdf (one page per figure, figures rasterized at @dpi) or .html (single self contained file, figures as svg)
+    plotEveryone : whether to include CCPM of the whole roster
+
+    Returns @filename.
+    """
+    kind = os.path.splitext(filename)[1].lower()
+    if kind not in [".pdf", ".html"]:
+        raise Exception(f"Unsupported report format {kind}, use .pdf or .html")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    figures = figureList(assignment, plotEveryone)
+    evaluation = evaluateAssignment(problem, assignment)
+
+    with tempfile.TemporaryDirectory(prefix = "druzinkator_report_") as workDir:
+        extension = "png" if kind == ".pdf" else "svg"
+        outFiles = [os.path.join(workDir, f"{figureName(*figure)}.{extension}") for figure in figures]
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers = workers, initializer = initReportWorker, initargs = (problem, assignment, attributeList, dpi)) as executor:
+                list(executor.map(renderReportFigure, figures, outFiles))
+        else:
+            initReportWorker(problem, assignment, attributeList, dpi)
+            list(map(renderReportFigure, figures, outFiles))
+
+        if kind == ".pdf":
+            writePdfReport(filename, evaluation, assignment, outFiles, dpi)
+        else:
+            writeHtmlReport(filename, evaluation, problem, assignment, figures, outFiles)
+
+    print(f"Report written to {filename}")
+    return filename
+
+
+def summaryLines(evaluation, assignment : Assignment) -> List[str]:
+    lines = str(evaluation).splitlines()
+    lines += [""] + [f"Company {i} : {len(company)} persons" for i, company in enumerate(assignment.companies)]
+    return lines
+
+
+def writePdfReport(filename : str, evaluation, assignment : Assignment, imageFiles : List[str], dpi = 150):
+    """
+    Writes summary pages and one page per rendered image into a multi-page pdf.  Only the cheap embedding of images
+    happens here, drawing is done by renderReportFigure().
+    """
+    import matplotlib.image
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    with PdfPages(filename) as pdf:
+        lines = summaryLines(evaluation, assignment)
+        for start in range(0, len(lines), REPORT_LINES_PER_PAGE):
+            fig = Figure(figsize = (8.27, 11.69))
+            fig.text(0.05, 0.97, "\n".join(lines[start : start + REPORT_LINES_PER_PAGE]), va = 'top', family = 'monospace', fontsize = 8)
+            pdf.savefig(fig)
+
+        for imageFile in imageFiles:
+            image = matplotlib.image.imread(imageFile)
+            fig = Figure(figsize = (image.shape[1] / dpi, image.shape[0] / dpi), dpi = dpi)
+            fig.figimage(image, resize = False)
+            pdf.savefig(fig, dpi = dpi)
+
+
+def writeHtmlReport(filename : str, evaluation, problem : Problem, assignment : Assignment, figures : List[tuple], imageFiles : List[str]):
+    """
+    Writes a single html file with the evaluation, the problem report, members of companies and all figures inlined.
+    """
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\"><title>Druzinkator report</title></head><body>",
+             "<h1>Druzinkator report</h1>", f"<pre>{html.escape(str(evaluation))}</pre>",
+             f"<pre>{html.escape(problem.report())}</pre>"]
+    for i, company in enumerate(assignment.companies):
+        parts.append(f"<h3>Company {i} ({len(company)} persons)</h3><p>{html.escape(', '.join(p.name for p in company))}</p>")
+
+    for figure, imageFile in zip(figures, imageFiles):
+        with open(imageFile, 'rb') as file:
+            data = base64.b64encode(file.read()).decode("ascii")
+        parts.append(f"<h2>{html.escape(figureName(*figure))}</h2><img style=\"max-width:100%\" src=\"data:image/svg+xml;base64,{data}\">")
+
+    parts.append("</body></html>")
+    with open(filename, 'w', encoding = "utf-8") as file:
+        file.write("\n".join(parts))
@@ -0,0 +1,192 @@
+
+import json
+import numpy as np
+import scipy.sparse as sp
+
+from .dataObjects import *
+
+from typing import List
+
+
+RESULT_FORMAT_VERSION = 1
+
+
+def saveResult(filename : str, problem : Problem, assignment : Assignment, stats = None, metadata : dict = None):
+    """
+    Saves @problem and @assignment (and optionally SolveStats @stats and a JSON serializable dict @metadata) into a compact .npz archive.
+    Only plain arrays are stored (company vector, names, presence and attribute matrices, CCPM in sparse form, weighs,
+    limits, couplings, fixings), no pickled objects, so archives keep loading when classes change.  See loadResult().
+    """
+    personList = problem.personList
+    personCount = len(personList)
+    table, rows = problem.getPersonTable()
+
+    if assignment.personList is personList:
+        companies = assignment.companyVector
+    else:
+        companies = np.array([assignment.getCompanyByName(p.name) for p in personList], dtype=float)
+        companies = np.nan_to_num(companies, nan = -1).astype(int)
+
+    #attributes of persons, including those the problem does not use
+    personAttributes = [a for a, column in table.attributeIndex.items() if a != "human" and np.any(table.attributes[rows, column])]
+
+    AAEweighs = np.full((len(problem.attributeList), problem.dayCount), np.nan)
+    for i, w in enumerate(problem.AAEweighs):
+        if w is not None:
+            AAEweighs[i] = w
+
+    limits = problem.attributeLimitsList
+    CCPM = sp.coo_matrix(problem.CCPM if problem.CCPM is not None else (personCount, personCount))
+
+    couplings = problem.personalCouplingList
+    data = {
+        "version" : np.array(RESULT_FORMAT_VERSION),
+        "companyCount" : np.array(problem.companyCount),
+        "dayCount" : np.array(problem.dayCount),
+        "companies" : companies,
+        "names" : np.array([p.name for p in personList], dtype=str),
+        "birthYears" : np.array([np.nan if p.birthYear is None else p.birthYear for p in personList], dtype=float),
+        "presence" : table.presence[rows],
+        "personAttributes" : np.array(personAttributes, dtype=str),
+        "attributeValues" : np.stack([table.attributeValues(a, rows) for a in personAttributes], axis = 1) if personAttributes else np.zeros((personCount, 0)),
+        "attributeList" : np.array(problem.attributeList, dtype=str),
+        "AAEweighs" : AAEweighs,
+        "limitAttributes" : np.array([l[0] for l in limits], dtype=int),
+        "limitMins" : np.array([l[1] for l in limits], dtype=float),
+        "limitMaxs" : np.array([l[2] for l in limits], dtype=float),
+        "limitEnable" : np.array([l[3] for l in limits], dtype=float).reshape(len(limits), problem.dayCount),
+        "limitSoftPenalties" : np.array([l[4] if len(l) > 4 else np.nan for l in limits], dtype=float),
+        "hasCCPM" : np.array(problem.CCPM is not None),
+        "ccpRows" : CCPM.row,
+        "ccpCols" : CCPM.col,
+        "ccpData" : CCPM.data,
+        "couplingPersons" : np.array([[problem.personDict[c[0].name], problem.personDict[c[1].name]] for c in couplings], dtype=int).reshape(-1, 2),
+        "couplingProducts" : np.array([c[2] for c in couplings], dtype=int),
+        "couplingSoftPenalties" : np.array([c[3] if len(c) > 3 else np.nan for c in couplings], dtype=float),
+        "companyFixes" : np.array([-1 if c is None else c for c in problem.companyFixList], dtype=int),
+        "stats" : np.array(json.dumps(stats.toDict() if stats is not None else None)),
+        "metadata" : np.array(json.dumps(metadata)),
+    }
+    np.savez_compressed(filename, **data)
+
+
+class ResultFile:
+    """
+    Result archive saved by saveResult().  Arrays are read from the archive on first access, Problem and Assignment
+    are only reconstructed when asked for.  The archive stays open until close(), use it as a context manager:
+
+        with loadResult("result.npz") as result:
+            problem = result.getProblem()
+
+    companies : company of each person (-1 if not assigned)
+    names : names of persons
+    stats : dict of SolveStats saved with the result, or None
+    metadata : dict saved with the result (e.g. cost and time of an incumbent snapshot), or None
+    """
+
+    def __init__(self, filename : str) -> None:
+        self.filename = filename
+        self.archive = np.load(filename, allow_pickle = False)
+        self.version = int(self.archive["version"])
+        if self.version > RESULT_FORMAT_VERSION:
+            raise Exception(f"{filename} has result format version {self.version}, only versions up to {RESULT_FORMAT_VERSION} are supported.  Update druzinkator.")
+        self.problem = None
+        self.assignment = None
+
+    def close(self):
+        """
+        Closes the archive.  Problem and Assignment already reconstructed stay available.
+        """
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def companies(self) -> np.array:
+        return self.archive["companies"]
+
+    @property
+    def names(self) -> List[str]:
+        return self.archive["names"].tolist()
+
+    @property
+    def stats(self) -> dict:
+        return json.loads(str(self.archive["stats"]))
+
+    @property
+    def metadata(self) -> dict:
+        return json.loads(str(self.archive["metadata"])) if "metadata" in self.archive else None
+
+    def getProblem(self) -> Problem:
+        """
+        Reconstructs the Problem.  Persons are new Person objects (views into a single PersonTable).
+        """
+        if self.problem is not None:
+            return self.problem
+
+        a = self.archive
+        birthYears = [None if np.isnan(y) else int(y) for y in a["birthYears"]]
+        personList = PersonTable.fromArrays(self.names, a["presence"], a["personAttributes"].tolist(), a["attributeValues"], birthYears)
+        problem = Problem(personList, int(a["companyCount"]), int(a["dayCount"]))
+
+        for i, attribute in enumerate(a["attributeList"].tolist()):
+            weighs = a["AAEweighs"][i]
+            problem.attributeList.append(attribute)
+            problem.attributeDict[attribute] = i
+            problem.AAEweighs.append(None if np.all(np.isnan(weighs)) else weighs)
+
+        for attrId, min, max, enableVector, softPenalty in zip(a["limitAttributes"], a["limitMins"], a["limitMaxs"], a["limitEnable"], a["limitSoftPenalties"]):
+            limitTuple = (int(attrId), float(min), float(max), enableVector)
+            if not np.isnan(softPenalty):
+                limitTuple += (float(softPenalty),)
+            problem.attributeLimitsList.append(limitTuple)
+
+        if bool(a["hasCCPM"]):
+            problem.setCCPM(sp.csr_matrix((a["ccpData"], (a["ccpRows"], a["ccpCols"])), shape = (len(personList), len(personList))))
+
+        for (i, j), product, softPenalty in zip(a["couplingPersons"], a["couplingProducts"], a["couplingSoftPenalties"]):
+            coupling = (personList[i], personList[j], int(product))
+            if not np.isnan(softPenalty):
+                coupling += (float(softPenalty),)
+            problem.personalCouplingList.append(coupling)
+
+        problem.companyFixList = [None if c < 0 else int(c) for c in a["companyFixes"]]
+
+        self.problem = problem
+        return problem
+
+    def getAssignment(self) -> Assignment:
+        """
+        Reconstructs the Assignment, over persons of getProblem().
+        """
+        if self.assignment is None:
+            problem = self.getProblem()
+            self.assignment = Assignment.fromCompanyVector(problem.personList, self.companies, problem.companyCount)
+        return self.assignment
+
+
+def loadResult(filename : str) -> ResultFile:
+    """
+    Opens a result archive saved by saveResult().  Nothing but the header is read until needed.  Close it when done,
+    see ResultFile.
+    """
+    return ResultFile(filename)
+
+
+def loadProblemAndAssignment(filename : str):
+    """
+    Returns (problem, assignment) stored in @filename, either a .npz archive of saveResult() or a legacy
+    [problem, result] pickle of exampleSetup.py.
+    """
+    if filename.endswith(".npz"):
+        with loadResult(filename) as result:
+            return result.getProblem(), result.getAssignment()
+
+    import pickle
+    with open(filename, 'rb') as file:
+        data = pickle.load(file)
+    return data[0], data[1]
@@ -0,0 +1,72 @@
+
+from .dataObjects import *
+from .matrixUtils import *
+from .optimize import optimize
+from .utils import getPeopleAlreadyPlacedByDay
+
+import numpy as np
+
+from typing import List
+
+
+def arrivalDays(personList : List[Person]) -> np.array:
+    """
+    Returns index of the first day each person is present (persons never present arrive on the last day).
+    """
+    if not personList:
+        return np.zeros(0, dtype=int)
+    table, rows = PersonTable.rowsOf(personList)
+    P = table.presence[rows] > 0
+    return np.where(P.any(axis = 1), P.argmax(axis = 1), P.shape[1] - 1)
+
+
+def optimizeRollingHorizon(problem : Problem, stageTime = 60, stageDays : List[int] = None, **optimizeArgs) -> Assignment:
+    """
+    Solves @problem in stages by arrival day, the way placement happens on site.
+    Stage k solves the subproblem of people present on stageDays[k] or before, with everyone placed in previous stages
+    fixed to their company (Problem.fixPeopleFromOldAssignment) and the previous assignment used as a warm start.
+    The last stage covers all persons.
+
+    Hard attribute limits of a stage only apply to days before the next stage starts, since later days are still
+    missing people who arrive later.  Soft limits and attribute error weighs are kept as they are.
+
+    Params:
+    ---------
+    stageTime : time limit of each stage in seconds, or a list with one limit per stage
+    stageDays : days at which stages end.  Defaults to arrival days of all waves of people.
+    optimizeArgs : passed on to optimize(), e.g. formulation or symmetryBreaking
+
+    Returns Assignment of all persons, or None if some stage could not be solved.
+    """
+    personList = problem.personList
+    if stageDays is None:
+        stageDays = sorted(set(arrivalDays(personList).tolist()))
+    stageDays = sorted(stageDays)
+    if not np.iterable(stageTime):
+        stageTime = [stageTime] * len(stageDays)
+
+    assignment = None
+    placedPeople = []
+    for k, day in enumerate(stageDays):
+        lastStage = k == len(stageDays) - 1
+        stagePeople = personList if lastStage else getPeopleAlreadyPlacedByDay(personList, day)
+        if len(stagePeople) == len(placedPeople):
+            continue    #nobody new arrived
+
+        stage = problem.subProblem(stagePeople)
+        if not lastStage:
+            completeDays = np.arange(problem.dayCount) < stageDays[k+1]
+            stage.attributeLimitsList = [l if len(l) > 4 else (l[0], l[1], l[2], l[3] * completeDays) for l in stage.attributeLimitsList]
+        if assignment is not None:
+            stage.fixPeopleFromOldAssignment(placedPeople, assignment)
+
+        print(f"Rolling horizon stage {k+1}/{len(stageDays)}: day {day}, {len(stagePeople) - len(placedPeople)} new persons, {len(stagePeople)} total")
+        result = optimize(stage, oldAssignment = assignment, maxtime = stageTime[k], **optimizeArgs)
+        if result is None:
+            print(f"Rolling horizon stage {k+1} could not be solved.")
+            return None
+
+        assignment = result
+        placedPeople = stagePeople
+
+    return assignment
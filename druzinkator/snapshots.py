@@ -0,0 +1,59 @@
+
+from .dataObjects import *
+from .matrixUtils import companyVectorToAssignment
+from .resultFile import saveResult
+
+import os
+import pickle
+import time
+
+
+class IncumbentSnapshots:
+    """
+    Progress callback (see ProgressEventhdlr) saving every incumbent found by the solver into @directory, so that
+    nothing is lost if a long solve is killed.  Each incumbent is written as snapshot_NNNN.<format> and copied to
+    best.<format>, both atomically (written under a temporary name, then renamed).  Snapshots are readable by
+    loadProblemAndAssignment().
+
+    format : "npz" (archive of saveResult(), cost and timestamp are stored as its metadata) or "pkl" (the
+        [problem, result, metadata] list, as exampleSetup.py --outpickle writes it plus metadata)
+    keepAll : if False, only best.<format> is kept
+    """
+
+    def __init__(self, problem : Problem, directory : str, format = "npz", keepAll = True) -> None:
+        if format not in ["npz", "pkl"]:
+            raise Exception(f"Unknown snapshot format '{format}'.  Use 'npz' or 'pkl'.")
+        self.problem = problem
+        self.directory = directory
+        self.format = format
+        self.keepAll = keepAll
+        self.count = 0
+        self.best = None
+        os.makedirs(directory, exist_ok = True)
+
+    def __call__(self, event : dict):
+        if event["event"] != "incumbent":
+            return
+
+        problem = self.problem
+        assignment = companyVectorToAssignment(problem.personList, event["companies"], problem.companyCount)
+        metadata = {"index" : self.count, "objective" : event["primalBound"], "cost" : event["cost"]["total"],
+                    "timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S"), "time" : event["time"], "nodes" : event["nodes"]}
+
+        bestFile = os.path.join(self.directory, f"best.{self.format}")
+        if self.keepAll:
+            snapshotFile = os.path.join(self.directory, f"snapshot_{self.count:04d}.{self.format}")
+            self.write(snapshotFile, assignment, metadata)
+        self.write(bestFile, assignment, metadata)
+
+        self.count += 1
+        self.best = bestFile
+
+    def write(self, filename : str, assignment : Assignment, metadata : dict):
+        temporary = os.path.join(self.directory, f".writing.{self.format}")
+        if self.format == "npz":
+            saveResult(temporary, self.problem, assignment, metadata = metadata)
+        else:
+            with open(temporary, 'wb') as file:
+                pickle.dump([self.problem, assignment, metadata], file)
+        os.replace(temporary, filename)
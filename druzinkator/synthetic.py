@@ -0,0 +1,106 @@
+
+from openpyxl import Workbook
+import numpy as np
+
+from .dataObjects import *
+
+from typing import List, Tuple
+
+
+def generateHistory(personCount : int, years : int, rng : np.random.Generator, attendance = 0.4, companyCount = 4) -> np.array:
+    """
+    Generates a fake history matrix (persons by years) in the format of vojtaToHistoryMatrix().
+    Each person attends camp in a random contiguous span of years with probability @attendance per year of the span.
+    """
+    historyMatrix = np.zeros((personCount, years))
+    firstYears = rng.integers(0, years, size = personCount)
+    lastYears = np.minimum(years, firstYears + rng.integers(1, 15, size = personCount))
+    for i in range(personCount):
+        span = np.arange(firstYears[i], lastYears[i])
+        attended = span[rng.random(len(span)) < attendance]
+        historyMatrix[i, attended] = rng.integers(1, companyCount + 1, size = len(attended))
+    return historyMatrix
+
+
+def writeHistoryWorkbook(filename : str, nameList : List[str], historyMatrix : np.array, birthYears : List[int] = None, firstYear = 1990):
+    """
+    Writes @historyMatrix into an excel workbook laid out like Vojta's table, so that it can be read by vojtaToHistoryMatrix().
+    """
+    COMPANY_NAMES = ["Modří", "Zelení", "Rudí", "Žlutí", "Bílí", "Černí", "Fialoví", "Oranžoví"]
+
+    excel = Workbook(write_only = True)
+    sheet = excel.create_sheet("STATISTIKA")
+    years = historyMatrix.shape[1]
+    sheet.append(["Příjmení", None, "Jméno", "Rok narození", None, None, None] + [firstYear + y for y in range(years)] + [None] * 3)
+    for i in range(10):
+        sheet.append([None])
+    for i, name in enumerate(nameList):
+        firstName, surname = name.split(" ", 1)
+        birthYear = birthYears[i] if birthYears is not None else None
+        companies = [COMPANY_NAMES[int(c) - 1] if c else None for c in historyMatrix[i]]
+        sheet.append([surname, None, firstName, birthYear, None, None, None] + companies + [None] * 3)
+    excel.save(filename)
+
+
+def generateInstance(personCount : int, seed = 0, historyYears = 20, historyPersonCount : int = None, companyCount = DEFAULT_COMPANY_COUNT,
+                     dayCount = DEFAULT_DAY_COUNT, partialPresence = 0.3) -> Tuple[List[Person], List[str], np.array]:
+    """
+    Generates a reproducible synthetic camp.
+
+    Returns:
+    ---------
+    personList : persons with random presence patterns and attributes (jokerit, matfyz)
+    historyNameList, historyMatrix : fake history in the format of vojtaToHistoryMatrix(), containing most of the persons
+        (the rest are newbies) and @historyPersonCount persons in total
+    """
+    rng = np.random.default_rng(seed)
+    if historyPersonCount is None:
+        historyPersonCount = 3 * personCount
+
+    historyNameList = [f"Jméno{i} Příjmení{i}" for i in range(historyPersonCount)]
+    historyMatrix = generateHistory(historyPersonCount, historyYears, rng, companyCount = companyCount)
+
+    #most campers have been to camp before, some are newbies
+    veterans = rng.choice(historyPersonCount, size = personCount, replace = False)
+    newbies = rng.random(personCount) < 0.2
+
+    personList = []
+    for i in range(personCount):
+        name = f"Nováček{i} Nový{i}" if newbies[i] else historyNameList[veterans[i]]
+        presence = np.ones(dayCount)
+        if rng.random() < partialPresence:
+            start = rng.integers(0, dayCount // 2)
+            end = rng.integers(start + 2, dayCount + 1)
+            presence = np.zeros(dayCount)
+            presence[start:end] = 1
+        attributes = [a for a, p in [("jokerit", 0.5), ("matfyz", 0.2)] if rng.random() < p]
+        Person(name, *attributes, presence = presence, addTo = personList)
+
+    return personList, historyNameList, historyMatrix
+
+
+def generateProblem(personList : List[Person], CCPM, seed = 0, companyCount = DEFAULT_COMPANY_COUNT, couplingCount : int = None) -> Problem:
+    """
+    Sets up a Problem over @personList like exampleSetup.py does: attribute error weighs, CCPM, a soft limit and
+    random keep apart / keep together couplings.
+    """
+    rng = np.random.default_rng(seed)
+    problem = Problem(personList, companyCount = companyCount)
+
+    defaultVector = np.array([0] + [1] * (problem.dayCount - 1))
+    problem.setAttributeErrorWeigh("human", 5 * defaultVector)
+    problem.setAttributeErrorWeigh("jokerit", defaultVector)
+    problem.setAttributeErrorWeigh("matfyz", defaultVector)
+    problem.setCCPM(CCPM)
+    problem.addAttributeLimits("matfyz", min = 1, soft = True)
+
+    if couplingCount is None:
+        couplingCount = len(personList) // 20
+    for k in range(couplingCount):
+        i, j = rng.choice(len(personList), size = 2, replace = False)
+        if k % 2:
+            problem.keepApart(personList[i], personList[j])
+        else:
+            problem.keepTogether(personList[i], personList[j], soft = True, softPenalty = 10)
+
+    return problem
@@ -1,5 +1,6 @@
 import re
 import unicodedata
+import numpy as np
 
 from .dataObjects import *
 
@@ -17,6 +18,14 @@ def unicodeToVariableName(unicodeString):
     
     return validVariableName
 
+def normalizeName(name : str) -> str:
+    """
+    Folds diacritics, case and whitespace of a name, so that e.g. "Petr  Brož" and "petr broz" give the same key.
+    """
+    normalizedString = unicodedata.normalize('NFKD', name)
+    asciiString = normalizedString.encode('ASCII', 'ignore').decode('ASCII')
+    return " ".join(asciiString.lower().split())
+
 def massAssign(persons : List[Person], attribute : str, value = None):
     for person in persons:
         if value == None:
@@ -88,13 +97,10 @@ def splitPopByAttribute(population : List[Person], attribute : str):
     Returns two sublists of population -- first of persons who have
     the specified attribute and another of persons who do not.
     """
-    haves = []
-    havenots = []
-    for person in population:
-        if person.get(attribute):
-            haves.append(person)
-        else:
-            havenots.append(person)
+    table, rows = PersonTable.rowsOf(population)
+    has = table.attributeValues(attribute, rows) != 0
+    haves = [population[i] for i in np.flatnonzero(has)]
+    havenots = [population[i] for i in np.flatnonzero(~has)]
 
     return haves, havenots
 
@@ -102,18 +108,9 @@ def getPeopleAlreadyPlacedByDay(population : List[Person], day):
     """
     Returns a sublist of @population containing those persons who are present on @day or before
     """
-
-    retVal = []
-
-    for person in population:
-        d = 0
-        while d <= day:
-            if person.presence[d] > 0:
-                retVal.append(person)
-                break
-            d += 1
-
-    return retVal
+    table, rows = PersonTable.rowsOf(population)
+    placed = np.any(table.presence[rows, :day+1] > 0, axis = 1)
+    return [population[i] for i in np.flatnonzero(placed)]
 
 if __name__ == "__main__":
     name = "Příšernus Nejmus 7"
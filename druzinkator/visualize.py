@@ -1,44 +1,144 @@
 
-import matplotlib.pyplot as plt
+import matplotlib
+import matplotlib.collections
 import numpy as np
+import os
+import scipy.sparse as sp
 from typing import List
 
 from .matrixUtils import *
+from .evaluate import assignmentToCompanyVector
 from .dataObjects import Person, Assignment
 
-def visualizeAssignment(assignment : Assignment, problem : Problem, attributeList = None):
+
+def createFigure(outFile = None, **kwargs):
+    """
+    Returns (figure, axes) as plt.subplots(**kwargs) does.  If @outFile is given, the figure is headless: it is not
+    registered with pyplot (no GUI backend is needed) and can only be saved, see finishFigure().
+    Pyplot is imported only when an interactive figure is requested.
+    """
+    if outFile is None:
+        import matplotlib.pyplot as plt
+        return plt.subplots(**kwargs)
+
+    from matplotlib.figure import Figure
+    fig = Figure(figsize = kwargs.pop("figsize", None))
+    return fig, fig.subplots(**kwargs)
+
+
+def finishFigure(fig, outFile = None):
+    """
+    Shows @fig, or saves it to @outFile (a filename or list of filenames, format given by the extension, e.g. png or svg).
+    """
+    if outFile is None:
+        fig.show()
+        return
+    for filename in ([outFile] if isinstance(outFile, str) else outFile):
+        fig.savefig(filename, bbox_inches = 'tight')
+
+
+def visualizeAssignment(assignment : Assignment, problem : Problem, attributeList = None, outDir : str = None, formats = ["png"], plotEveryone = None):
     """
     Visualizes supplied assignment and problem.
     All attributes specified in problem.attributeList will be visualized, unless attributeList argument is given.
-    """
 
-    if attributeList is None:
-        attributeList = problem.attributeList
-    CCPM = problem.CCPM
+    Params:
+    ---------
+    outDir : if given, nothing is shown.  Figures are written into this directory instead, in each of @formats
+        (e.g. ["png", "svg"]).  Returns list of written files.
+    plotEveryone : whether to plot CCPM of the whole roster too (ordered by company).  Defaults to True when writing files.
+    """
+    if outDir is not None:
+        os.makedirs(outDir, exist_ok = True)
+    if plotEveryone is None:
+        plotEveryone = outDir is not None
 
-    print(f"Taking into account attributes {attributeList}")
+    print(f"Taking into account attributes {attributeList if attributeList is not None else problem.attributeList}")
     print("Visualizing following assignment:")
     print(assignment)
 
-    #prep DIM
-    DSM, _ = calculateDailyMatrices(assignment.personList, attributeList)
-    DIM = DSM / 4
+    written = []
+    for figure in figureList(assignment, plotEveryone):
+        outFile = None
+        if outDir is not None:
+            outFile = [os.path.join(outDir, f"{figureName(*figure)}.{f}") for f in formats]
+            written += outFile
+        plotFigure(figure, assignment, problem, outFile, attributeList)
+
+    if outDir is None:
+        input()
+        return None
+    return written
+
+
+def figureList(assignment : Assignment, plotEveryone = False) -> List[tuple]:
+    """
+    Figures of visualizeAssignment() as (kind, company) tuples, see plotFigure().
+    """
+    figures = [("attributes", None)]
+    if plotEveryone:
+        figures.append(("ccpm", None))
+    figures += [("ccpm", i) for i in range(assignment.companyCount)]
+    figures += [("presence", i) for i in range(assignment.companyCount)]
+    return figures
+
 
-    tdays = np.linspace(1, 14, 14)
+def figureName(kind : str, company : int) -> str:
+    return kind if kind == "attributes" else f"{kind}_{'everyone' if company is None else f'company{company}'}"
+
+
+def plotFigure(figure : tuple, assignment : Assignment, problem : Problem, outFile = None, attributeList = None):
+    """
+    Plots one figure of figureList(): ("attributes", None) attribute balance, ("ccpm", i) CCPM of company i (of everyone,
+    ordered by company, if i is None), ("presence", i) presence of members of company i.
+    """
+    kind, company = figure
+    if kind == "attributes":
+        return plotAttributeBalance(assignment, problem, attributeList, outFile)
+    if kind == "ccpm" and company is None:
+        #whole roster, ordered by company so that companies form diagonal blocks
+        order = np.argsort(assignmentToCompanyVector(problem, assignment), kind = 'stable')
+        return plotCCPM(assignment, problem, [problem.personList[j] for j in order], "Co-Company Penalty Matrix (Everyone)", outFile = outFile)
+    if kind == "ccpm":
+        return plotCCPM(assignment, problem, assignment.companies[company], f"Co-Company Penalty Matrix for Company #{company}", outFile = outFile)
+    if kind == "presence":
+        return plotCompanyMembersDays(assignment.companies[company], title = f"Presence for company #{company}", outFile = outFile)
+    raise Exception(f"Unknown figure {figure}")
+
+
+def plotAttributeBalance(assignment : Assignment, problem : Problem, attributeList = None, outFile = None):
+    """
+    Plots daily sums of attributes in each company against the ideal (all attributes of problem unless @attributeList is given).
+    Shows the figure, or saves it to @outFile (see finishFigure()) without needing a display.
+    """
+    if attributeList is None:
+        attributeList = problem.attributeList
+
+    #prep DIM, reusing data cached by problem when it knows all the attributes
+    if all(a in problem.attributeDict for a in attributeList):
+        attrIds = [problem.attributeDict[a] for a in attributeList]
+        DAT = problem.getDerivedData().DAT[:, attrIds, :]
+    else:
+        DAT = DerivedData(problem.personList, attributeList, dayCount = problem.dayCount).DAT
+    DSM = DAT.sum(axis = 0)
+    DIM = DSM / assignment.companyCount
+
+    dayCount = DSM.shape[1]
+    tdays = np.linspace(1, dayCount, dayCount)
 
     hratios = [(int(x == "human")*0.5 + 1) for x in attributeList]  #make manpower subplot a little bigger
-    attrFig, attrAxs = plt.subplots(len(attributeList), gridspec_kw={'height_ratios':hratios})
+    attrFig, attrAxs = createFigure(outFile, nrows = len(attributeList), gridspec_kw={'height_ratios':hratios}, squeeze = False,
+                                    figsize = None if outFile is None else (10, 2 + 1.5*sum(hratios)))
+    attrAxs = attrAxs[:, 0]
     attrFig.suptitle("Daily attribute balance comparision")
 
-    companyDSMs = []
-    for company in assignment.companies:
-        DSM_thiscomp, _ = calculateDailyMatrices(company, attributeList)
-        companyDSMs.append(DSM_thiscomp)
+    companies = assignmentToCompanyVector(problem, assignment)
+    companyDSMs = [DAT[companies == j].sum(axis = 0) for j in range(assignment.companyCount)]
 
     lastI = len(attributeList) - 1
     for i, attribute in enumerate(attributeList):
         ax = attrAxs[i]
-        for j in range(4):
+        for j in range(assignment.companyCount):
             attrData = (companyDSMs[j])[i, :]
             ax.plot(tdays, attrData, '--', linewidth = 2, alpha = 0.8)
         ax.set_xticks(tdays)
@@ -46,162 +146,142 @@ def visualizeAssignment(assignment : Assignment, problem : Problem, attributeLis
         ax.plot(tdays, ideal, linewidth = 3, alpha = 0.7)
 
         if i == 0:
-            ax.legend(["C0", "C1", "C2", "C3", "Ideal"], loc = 'upper right')
+            ax.legend([f"C{j}" for j in range(assignment.companyCount)] + ["Ideal"], loc = 'upper right')
 
         if i != lastI:
             empty_string_labels = ['']*len(tdays)
             ax.set_xticklabels(empty_string_labels)
         else:
-            week = ['po','ut','st','ct','pa','so','ne']
-            labels = ['so', 'ne']
-            labels.extend(week)
-            labels.extend(week)
-            labels = labels[:-2]
-            ax.set_xticklabels(labels)
+            ax.set_xticklabels(dayLabels(dayCount))
 
 
         ax.set_ylabel(attribute)
         ax.grid()
 
-    attrFig.show()
-    #plotCCPM(assignment, problem) #dont plot the big ccpm,
-    for i in range(4):
-        title = f"Co-Company Penalty Matrix for Company #{i}"
-        plotCCPM(assignment, problem, assignment.companies[i], title)
-
-    for i in range(4):
-        plotCompanyMembersDays(assignment.companies[i], title= f"Presence for company #{i}" )
-
-    input()
+    finishFigure(attrFig, outFile)
+    return attrFig
 
 
-def plotCompanyMembersDays(persons: List[Person], title = ""):
-
-    fig, ax = plt.subplots()
+def dayLabels(dayCount : int) -> List[str]:
+    """
+    Names of days of camp, which always starts on saturday.
+    """
+    week = ['so','ne','po','ut','st','ct','pa']
+    return [week[day % 7] for day in range(dayCount)]
 
-    #plt.figure(figsize=(10, len(persons) * 0.5))  # Adjusting the figure size for better readability
 
+def plotCompanyMembersDays(persons: List[Person], title = "", outFile = None):
+    """
+    Plots presence of @persons on each day (green present, red absent) as a single scatter.
+    Shows the figure, or saves it to @outFile (see finishFigure()) without needing a display.
+    """
     persons = sorted(persons, key = lambda p : sum(p.presence))
+    dayCount = len(persons[0].presence) if persons else DEFAULT_DAY_COUNT
 
-    for idx, person in enumerate(persons):
-        presence = person.presence
-        for day, present in enumerate(presence):
-            color = 'green' if present else 'red'
-            ax.scatter(day+1, idx, color=color, s=100)  # s controls the size of the markers
+    fig, ax = createFigure(outFile, figsize = None if outFile is None else (8, 1 + 0.25*len(persons)))
+
+    table, rows = PersonTable.rowsOf(persons)
+    presence = table.presence[rows].astype(bool)
+    idx, day = np.indices(presence.shape)
+    colors = np.where(presence, 'green', 'red').ravel()
+    ax.scatter(day.ravel()+1, idx.ravel(), c=colors, s=100)  # s controls the size of the markers
 
     ax.set_title(title)
     ax.set_yticks(range(len(persons)), [person.name for person in persons])
 
-    week = ['po','ut','st','ct','pa','so','ne']
-    labels = ['so', 'ne']
-    labels.extend(week)
-    labels.extend(week)
-    labels = labels[:-2]
-    tdays = np.linspace(1,14,14)
+    tdays = np.linspace(1,dayCount,dayCount)
 
     ax.set_xticks(tdays)
-    ax.set_xticklabels(labels)
+    ax.set_xticklabels(dayLabels(dayCount))
 
     ax.grid(True)
-    fig.show()
+    finishFigure(fig, outFile)
+    return fig
 
 
-def plotCCPM(assignment : Assignment, problem : Problem, personList = None, title = None):
-    #cocompany penalty matrix plot
+def plotCCPM(assignment : Assignment, problem : Problem, personList = None, title = None, outFile = None):
+    """
+    Plots co-company penalty matrix of @personList (everyone by default) as a single image.  Cells of people sharing
+    a company are coloured (red by severity of penalty, green for none), cells of those sharing a company without
+    meeting get a white inset.  Values are written into cells only where the text fits.
+    Shows the figure, or saves it to @outFile (see finishFigure()) without needing a display.
+    """
+    if personList is None:
+        personList = assignment.personList
+    pcount = len(personList)
 
-    CCPMfig, ax = plt.subplots()
+    figsize = None
+    if outFile is not None:
+        side = min(max(6.4, 2 + 0.3*pcount), 40)
+        figsize = (side, side)
+    CCPMfig, ax = createFigure(outFile, figsize = figsize)
 
     if title is None:
         CCPMfig.suptitle("Co-Company Penalty Matrix (Everyone)")
     else:
         CCPMfig.suptitle(title)
 
-    if personList is None:
-        personList = assignment.personList
-    CCPM = problem.CCPM
-
-    maxVal = CCPM.max()
-
-    pcount = len(personList)
-
-    griddingRange = list(range(pcount+1))
+    #penalties straight from CCPM, the pair index leaves out pairs that never meet
+    globalIndices = np.array([problem.personDict[p.name] for p in personList], dtype=int)
+    if problem.CCPM is None:
+        fullCCPM = sp.csr_matrix((len(problem.personList), len(problem.personList)))
+    else:
+        fullCCPM = sp.csr_matrix(problem.CCPM)
+    CCPM = fullCCPM[globalIndices, :][:, globalIndices].toarray()
+    table, rows = PersonTable.rowsOf(personList)
+    P = table.presence[rows]
+    overlapMatrix = P @ P.T
+
+    maxVal = fullCCPM.max()
+
+    companies = assignment.companyVector[globalIndices]
+    diagonal = np.eye(pcount, dtype=bool)
+    sharedCompany = (companies[:, np.newaxis] == companies[np.newaxis, :]) & ~diagonal
+    dontMeet = sharedCompany & (overlapMatrix == 0)
+
+    #cell colours
+    image = np.ones((pcount, pcount, 3))
+    image[diagonal] = matplotlib.colors.to_rgb('lightgray')
+    image[sharedCompany & (CCPM <= 0)] = (0.8, 1, 0.7)
+    penalized = sharedCompany & (CCPM > 0)
+    norm = CCPM[penalized] / maxVal if maxVal > 0 else 0
+    image[penalized] = np.stack([np.ones_like(norm), 0.5*(1-norm), 0.5*(1-norm)], axis = -1)
+    ax.imshow(image, extent = (0, pcount, pcount, 0), interpolation = 'nearest')
+
+    if dontMeet.any():
+        I, J = np.nonzero(dontMeet)
+        insets = np.stack([np.stack([J+0.1, I+0.1], axis = -1), np.stack([J+0.9, I+0.1], axis = -1),
+                           np.stack([J+0.9, I+0.9], axis = -1), np.stack([J+0.1, I+0.9], axis = -1)], axis = 1)
+        ax.add_collection(matplotlib.collections.PolyCollection(insets, facecolors = 'white', edgecolors = 'none'))
+
+    #cell borders as two line collections rather than a grid of ticks, names as tick labels
     labelingRange = [x + 0.5 for x in range(pcount)]
+    labelSize = 'medium' if pcount <= 40 else 6
+    names = [p.name for p in personList]
+    gridStyle = dict(color = '#b0b0b0', linewidth = 0.8 if pcount <= 40 else 0.3)
 
     ax.set_aspect('equal')
-    ax.set_xticks(griddingRange, [""]*len(griddingRange))
-    ax.set_xticks(labelingRange, minor = True)
-    ax.set_xticklabels([p.name for p in personList], minor = True, rotation = 90)
-
-    ax.set_yticks(griddingRange, [""]*len(griddingRange))
-    ax.set_yticks(labelingRange, minor = True)
-    ax.set_yticklabels([p.name for p in personList], minor = True, rotation = 0)
-
-    ax.invert_yaxis()
-
-    ax.grid()
-
-    for j in range(pcount):
-        for i in range(pcount):
-            if i==j:
-                ax.text(j+0.5, i+0.5, "-", va='center', ha='center', color='black', clip_on = True)
-                ax.fill_between([j, j+1], i, i+1, color='lightgray')
-                continue
-
-            p1 = personList[i]
-            p2 = personList[j]
-            
-            globalI = problem.personDict[p1.name]
-            globalJ = problem.personDict[p2.name]
-            ccp = CCPM[globalI,globalJ]
-            textVal = f"{ccp:.1f}"
-            
-            #print(f"{p1.name} x {p2.name} -> {assignment.getCompanyByName(p1.name)} vs {assignment.getCompanyByName(p2.name)}")
-
-            #sharedCompany = (assignment.getCompanyByName(p1.name) == assignment.getCompanyByName(p2.name))
-            sharedCompany = assignment.SCM[globalI,globalJ]
-
-            dontMeet = 0
-            
-            if sharedCompany:
-                intersectionDays = np.sum(p1.presence * p2.presence)
-                if intersectionDays == 0:
-                    dontMeet = 1
-                else:
-                    textVal += f"×{int(intersectionDays)}"
-
-            color = 'white'
-            if sharedCompany:
-                if ccp > 0:
-                    #maybe todo: pass twice and change red hue depending on severity?
-                    norm = ccp/maxVal
-                    gb = 0.5
-                    bb = 0.5
-                    g = gb*(1-norm)
-                    b = bb*(1-norm)
-                    color = (1, g, b)
-                else:
-                    color = (0.8, 1, 0.7)
-
-            ax.text(j+0.5, i+0.5, textVal, va='center', ha='center', fontsize= 7, color='black', clip_on = True)
-            ax.fill_between([j, j+1], i, i+1, color=color)
-
-            if dontMeet:
-                ax.fill_between([j+0.1, j+0.9], i+0.1, i+0.9, color='white')
-
-
-    CCPMfig.show()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    ax.vlines(range(pcount+1), 0, pcount, **gridStyle)
+    ax.hlines(range(pcount+1), 0, pcount, **gridStyle)
+    ax.set_xlim(0, pcount)
+    ax.set_ylim(pcount, 0)
+    ax.set_xticks(labelingRange, names, rotation = 90, fontsize = labelSize)
+    ax.set_yticks(labelingRange, names, rotation = 0, fontsize = labelSize)
+    ax.tick_params(length = 0)
+
+    #write values only where they fit: into saved figures if cells are big enough for "0.5×12" in at least 5pt font,
+    #into interactive ones (which can be zoomed) unless the matrix is big
+    if outFile is None:
+        fontsize = 7 if pcount <= 60 else 0
+    else:
+        cellPoints = CCPMfig.get_figwidth() * ax.get_position().width * 72 / max(pcount, 1)
+        fontsize = min(7, cellPoints / 4)
+    if fontsize >= 5:
+        texts = np.char.mod("%.1f", CCPM)
+        texts = np.where(sharedCompany & ~dontMeet, np.char.add(np.char.add(texts, "×"), overlapMatrix.astype(int).astype(str)), texts)
+        texts[diagonal] = "-"
+        for (i, j), text in np.ndenumerate(texts):
+            ax.text(j+0.5, i+0.5, text, va='center', ha='center', fontsize = fontsize if i != j else None, color='black', clip_on = True)
+
+    finishFigure(CCPMfig, outFile)
+    return CCPMfig
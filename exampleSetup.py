@@ -6,13 +6,17 @@ from druzinkator.dataObjects import *
 from druzinkator.matrixUtils import *
 from druzinkator.optimize import optimize
 from druzinkator.visualize import visualizeAssignment
+from druzinkator.resultFile import saveResult
 
 @click.command()
-@click.option('-o', '--outpickle', default = None, help = "If specified, saves assignment to pickle at defined location")
-@click.option('-i', '--inpickle', default = None, help = "If specified, loads assignment from defined pickle and adds them as constraints.")
+@click.option('-o', '--outpickle', default = None, help = "If specified, saves problem and assignment at defined location (compact .npz archive, or legacy pickle if the name ends with .pkl)")
+@click.option('-i', '--inpickle', default = None, help = "If specified, loads assignment from defined .npz archive or pickle and uses it as a starting solution.")
 @click.option('-v', '--vojtafile', default = "tabory_ucastnici.xlsx", help = "Vojta's excel file")
-@click.option('-t', '--maxtime', default = None, help = "Maximum time to run the solver for (seconds).")
-def defineAndSolveProblem(outpickle, inpickle, vojtafile, maxtime):
+@click.option('-t', '--maxtime', default = None, type = float, help = "Maximum time to run the solver for (seconds).")
+@click.option('-s', '--statsfile', default = None, help = "If specified, saves solver statistics (time, memory and model size per phase) as JSON.")
+@click.option('-p', '--progressfile', default = None, help = "If specified, streams solver progress (incumbents with cost breakdown, bounds) into this file as JSON lines.")
+@click.option('-d', '--snapshotdir', default = None, help = "If specified, every solution found during the solve is saved into this directory (best one as best.npz, or best.pkl if --outpickle ends with .pkl).")
+def defineAndSolveProblem(outpickle, inpickle, vojtafile, maxtime, statsfile, progressfile, snapshotdir):
 
     personList = []
 
@@ -66,19 +70,23 @@ def defineAndSolveProblem(outpickle, inpickle, vojtafile, maxtime):
 
     #-------------------------------------------------------------------------------------
 
-    result = optimize(problem, maxtime)
+    solved = optimize(problem, oldAssignment = inpickle, maxtime = maxtime, statsFile = statsfile, progressFile = progressfile,
+                      snapshotDir = snapshotdir, snapshotFormat = "pkl" if outpickle is not None and outpickle.endswith(".pkl") else "npz", returnStats = True)
+    result = solved.assignment
     if result is None:
         return
 
 
 
     if  outpickle is not None:
-        if not outpickle.endswith(".pkl"):
-            outpickle += ".pkl"
-
-        with open(outpickle, 'wb') as file:
-            saveList = [problem, result]
-            pickle.dump(saveList, file)
+        if outpickle.endswith(".pkl"):
+            with open(outpickle, 'wb') as file:
+                saveList = [problem, result]
+                pickle.dump(saveList, file)
+        else:
+            if not outpickle.endswith(".npz"):
+                outpickle += ".npz"
+            saveResult(outpickle, problem, result, solved.stats)
 
 
     print(problem.report())
@@ -0,0 +1,20 @@
+import click
+
+from druzinkator.benchmark import runBenchmark
+
+@click.command()
+@click.option('-n', '--personcounts', default = "50,100,200,400,1000", help = "Comma separated list of person counts to sweep.")
+@click.option('-s', '--seeds', default = "0", help = "Comma separated list of seeds of synthetic instances.")
+@click.option('-y', '--historyyears', default = 20, help = "Number of years of fake history.")
+@click.option('-t', '--maxtime', default = 60.0, help = "Time limit of each solve (seconds).")
+@click.option('-g', '--gap', default = 0.05, help = "Relative gap at which the solve stops.")
+@click.option('--visualize/--no-visualize', default = True, help = "Whether to time rendering of company plots.")
+@click.option('-o', '--outfile', default = "benchmark.json", help = "Where to write the JSON report.")
+def benchmark(personcounts, seeds, historyyears, maxtime, gap, visualize, outfile):
+    personCounts = [int(n) for n in personcounts.split(",")]
+    seedList = [int(s) for s in seeds.split(",")]
+    runBenchmark(personCounts, seedList, outFile = outfile, historyYears = historyyears, maxtime = maxtime, gap = gap, visualize = visualize)
+    print(f"Report written to {outfile}")
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,32 +1,37 @@
 import click
-import numpy as np
-import pickle
 
-from druzinkator.dataObjects import *
-from druzinkator.matrixUtils import *
-from druzinkator.optimize import optimize
+from druzinkator.resultFile import loadProblemAndAssignment
 from druzinkator.visualize import visualizeAssignment
+from druzinkator.report import renderReport
 
 
 @click.command()
 @click.argument('input')
-def visualizePickle(input):
-    print(f"Visualizing pickle {input}")
-    file = open(input, 'rb')
-    data = pickle.load(file)
-    file.close()
-
-    problem = data[0]
-    result = data[1]
+@click.option('--outdir', '-o', default = None, help = "Write figures into this directory instead of showing them (no display needed).")
+@click.option('--format', '-f', 'formats', default = "png", help = "Comma separated formats of written figures, e.g. png,svg.")
+@click.option('--report', '-r', default = None, help = "Render everything into a single report file (.pdf or .html) instead of showing it.")
+@click.option('--workers', '-w', default = None, type = int, help = "Processes rendering figures of the report, defaults to number of CPUs.")
+def visualizePickle(input, outdir, formats, report, workers):
+    """
+    Visualizes a result saved by exampleSetup.py, either a .npz archive or a legacy pickle.
+    """
+    print(f"Visualizing result {input}")
+    problem, result = loadProblemAndAssignment(input)
 
     print(result)
     print(problem.attributeList)
 
     print(problem.report())
 
-    visualizeAssignment(result, problem)
+    if report is not None:
+        renderReport(problem, result, report, workers = workers)
+        return
+
+    written = visualizeAssignment(result, problem, outDir = outdir, formats = formats.split(","))
+    if written:
+        print(f"Figures written: {', '.join(written)}")
 
 
 
 if __name__ == '__main__':
-    visualizePickle()
\ No newline at end of file
+    visualizePickle()